@@ -0,0 +1,239 @@
+# benchmarks/fake_wp.py
+import datetime
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+API_PREFIX = "/wp-json/wp/v2"
+BATCH_PATH = "/wp-json/batch/v1"
+BATCH_LIMIT = 25
+MAX_PER_PAGE = 100
+RENDERED_FIELDS = ("title", "content", "excerpt")
+
+class FakeWordPress:
+    """
+    In-memory stand-in for a WordPress REST API, served over HTTP on 127.0.0.1.
+    Supports collection paging (X-WP-Total / X-WP-TotalPages), _fields, include, context=edit,
+    modified_after, item CRUD, /batch/v1, media uploads and static HTML pages for scraping.
+    Every request is delayed by `latency` seconds; a `throttle_rate` fraction is answered
+    with 429 and Retry-After: 0.
+    """
+
+    def __init__(self, latency: float = 0.0, throttle_rate: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.random = random.Random(seed)
+        self.items = {}
+        self.next_id = 1
+        self.requests = 0
+        self.throttled = 0
+        self.lock = threading.Lock()
+        self.server = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def api_base(self) -> str:
+        return self.url + API_PREFIX
+
+    def start(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self.server.daemon_threads = True
+        self.server.wp = self
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def seed(self, endpoint: str, count: int):
+        """Replace the collection with `count` generated items (ids are assigned sequentially)."""
+        with self.lock:
+            self.items[endpoint] = {}
+            for n in range(count):
+                self._create(endpoint, {
+                    "title": f"Listing {n}",
+                    "content": f"<p>Item {n} description. " + "Lorem ipsum dolor sit amet. " * 20 + "</p>",
+                    "excerpt": f"Short summary for item {n}.",
+                    "status": "publish",
+                    "meta": {"hp_price": n % 5000, "hp_location": f"City {n % 50}"},
+                })
+
+    def _create(self, endpoint: str, changes: dict) -> dict:
+        item = {"id": self.next_id, "status": "draft", "meta": {}, "type": endpoint}
+        self.next_id += 1
+        self._apply(item, changes)
+        self.items.setdefault(endpoint, {})[item["id"]] = item
+        return item
+
+    def _apply(self, item: dict, changes: dict):
+        for field, value in changes.items():
+            if field in RENDERED_FIELDS and isinstance(value, dict):
+                value = value.get("raw", value.get("rendered", ""))
+            if field == "meta" and isinstance(value, dict):
+                item["meta"] = dict(item.get("meta", {}), **value)
+            elif field != "id":
+                item[field] = value
+        now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        item["modified"] = item["modified_gmt"] = now.isoformat(timespec="microseconds")
+
+    def render(self, item: dict, edit: bool = False, fields: list = None) -> dict:
+        data = {}
+        for field, value in item.items():
+            if field in RENDERED_FIELDS:
+                value = {"raw": value, "rendered": value} if edit else {"rendered": value}
+            data[field] = value
+        if fields:
+            data = {field: data[field] for field in fields if field in data}
+        return data
+
+    def list_items(self, endpoint: str, query: dict) -> (list, int, int):
+        per_page = min(int(query.get("per_page", 10)), MAX_PER_PAGE)
+        page = int(query.get("page", 1))
+        with self.lock:
+            items = list(self.items.get(endpoint, {}).values())
+        if "include" in query:
+            wanted = {int(i) for i in query["include"].split(",") if i.strip().isdigit()}
+            items = [item for item in items if item["id"] in wanted]
+        if "modified_after" in query:
+            items = [item for item in items if item["modified_gmt"] > query["modified_after"]]
+        if query.get("orderby") == "modified":
+            items.sort(key=lambda item: item["modified_gmt"], reverse=query.get("order") != "asc")
+        total = len(items)
+        total_pages = max(1, -(-total // per_page))
+        fields = query["_fields"].split(",") if query.get("_fields") else None
+        edit = query.get("context") == "edit"
+        page_items = items[(page - 1) * per_page:page * per_page]
+        return [self.render(item, edit, fields) for item in page_items], total, total_pages
+
+    def handle(self, method: str, path: str, query: dict, body) -> (int, dict, object):
+        """Route one REST request; returns (status, extra headers, JSON-serialisable body)."""
+        if path.startswith(API_PREFIX + "/"):
+            parts = path[len(API_PREFIX) + 1:].strip("/").split("/")
+            endpoint = parts[0]
+            item_id = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else None
+            if endpoint == "media" and method == "POST" and item_id is None:
+                with self.lock:
+                    item = self._create("media", {"title": "upload", "media_type": "image",
+                                                  "media_details": {"filesize": len(body or b"")}})
+                    item["source_url"] = f"{self.url}/wp-content/uploads/{item['id']}.jpg"
+                    return 201, {}, self.render(item)
+            return self._item_request(method, endpoint, item_id, query, body)
+        if path == BATCH_PATH and method == "POST":
+            return self._batch(json.loads(body or b"{}"))
+        return 404, {}, {"code": "rest_no_route", "message": "No route was found."}
+
+    def _item_request(self, method: str, endpoint: str, item_id, query: dict, body) -> (int, dict, object):
+        if method == "OPTIONS":
+            return 200, {}, {"namespace": "wp/v2", "methods": ["GET", "POST"], "allow_batch": {"v1": True}}
+        if item_id is None:
+            if method == "GET":
+                items, total, total_pages = self.list_items(endpoint, query)
+                return 200, {"X-WP-Total": str(total), "X-WP-TotalPages": str(total_pages)}, items
+            if method == "POST":
+                with self.lock:
+                    return 201, {}, self.render(self._create(endpoint, json.loads(body or b"{}")))
+            return 405, {}, {"code": "rest_no_route", "message": "Method not allowed."}
+        with self.lock:
+            item = self.items.get(endpoint, {}).get(item_id)
+            if item is None:
+                return 404, {}, {"code": "rest_post_invalid_id", "message": "Invalid post ID."}
+            if method == "GET":
+                return 200, {}, self.render(item, query.get("context") == "edit")
+            if method in ("POST", "PUT", "PATCH"):
+                self._apply(item, json.loads(body or b"{}"))
+                return 200, {}, self.render(item)
+            if method == "DELETE":
+                del self.items[endpoint][item_id]
+                return 200, {}, {"deleted": True, "previous": self.render(item)}
+        return 405, {}, {"code": "rest_no_route", "message": "Method not allowed."}
+
+    def _batch(self, payload: dict) -> (int, dict, object):
+        requests = payload.get("requests", [])
+        if len(requests) > BATCH_LIMIT:
+            return 400, {}, {"code": "rest_batch_max_requests", "message": f"Maximum {BATCH_LIMIT} requests."}
+        responses = []
+        for sub in requests:
+            sub_body = json.dumps(sub.get("body", {})).encode()
+            status, headers, data = self.handle(sub.get("method", "POST"), "/wp-json" + sub.get("path", ""),
+                                                {}, sub_body)
+            responses.append({"status": status, "headers": headers, "body": data})
+        return 207, {}, {"responses": responses}
+
+    def page_html(self, number: int) -> str:
+        paragraphs = "".join(f"<p>Paragraph {i} of page {number}. " + "Some scraped text. " * 15 + "</p>"
+                             for i in range(20))
+        images = "".join(f'<img src="/images/{number}-{i}.jpg" alt="">' for i in range(10))
+        return (f"<html><head><title>Page {number}</title>"
+                f'<meta name="description" content="Description of page {number}">'
+                f'<meta name="keywords" content="benchmark, page{number}"></head><body>'
+                f"{paragraphs}{images}"
+                f'<iframe src="https://www.youtube.com/embed/video{number}"></iframe></body></html>')
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _dispatch(self):
+        wp = self.server.wp
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else None
+        parts = urlsplit(self.path)
+        with wp.lock:
+            wp.requests += 1
+            throttle = wp.throttle_rate and wp.random.random() < wp.throttle_rate
+            if throttle:
+                wp.throttled += 1
+        if wp.latency:
+            time.sleep(wp.latency)
+        if throttle:
+            return self._send(429, {"Retry-After": "0"}, {"code": "rest_too_many_requests", "message": "Slow down."})
+        match = re.fullmatch(r"/shop/page-(\d+)/?", parts.path)
+        if match and self.command == "GET":
+            return self._send_html(wp.page_html(int(match.group(1))))
+        query = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+        try:
+            status, headers, data = wp.handle(self.command, parts.path, query, body)
+        except (ValueError, KeyError) as e:
+            status, headers, data = 400, {}, {"code": "rest_invalid_param", "message": str(e)}
+        self._send(status, headers, data)
+
+    def _send(self, status: int, headers: dict, data):
+        payload = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=UTF-8")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _send_html(self, html: str):
+        etag = '"' + hashlib.md5(html.encode()).hexdigest() + '"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        payload = html.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=UTF-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = do_OPTIONS = _dispatch
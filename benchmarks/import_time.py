@@ -0,0 +1,127 @@
+# benchmarks/import_time.py
+"""
+Cold import time of the app's modules, each measured in a fresh interpreter.
+
+    python -m benchmarks.import_time                       # every module, median of 5 runs
+    python -m benchmarks.import_time --only utils.file_utils utils.ai --repeat 10 --top 5
+    python -m benchmarks.import_time --check               # exit 1 if a heavy library loads at import
+
+Pages re-run their imports on every cold start, so anything a module pulls in at import time
+is paid before the first widget renders. Besides the time, the report lists which heavy
+libraries (pandas, PyMuPDF, python-docx, Pillow, BeautifulSoup, openai, ...) were loaded as a
+side effect; they should only load when the feature that needs them is used.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from benchmarks.run import REPO_ROOT
+
+MODULES = ("utils.metrics", "utils.http_session", "utils.journal", "utils.diff", "utils.wp_api",
+           "utils.executor", "utils.mirror", "utils.query", "utils.ai_cache", "utils.ai", "utils.scraper",
+           "utils.media", "utils.file_utils", "utils.ingest", "utils.auth", "utils.jobs", "utils.multisite")
+# Imported lazily on purpose; loading one of these at import time is a startup regression.
+# chardet is not listed: requests imports it whenever it is installed.
+HEAVY = ("pandas", "numpy", "fitz", "docx", "PIL", "bs4", "openai", "openpyxl", "cryptography")
+# Streamlit is a dependency of the pages themselves, so modules that need it are reported, not flagged.
+UI = ("streamlit",)
+
+_CHILD = """
+import sys, time
+print("--- start ---", file=sys.stderr, flush=True)
+started = time.perf_counter()
+try:
+    __import__({module!r})
+    error = None
+except Exception as e:
+    error = f"{{type(e).__name__}}: {{e}}"
+seconds = time.perf_counter() - started
+import json
+print(json.dumps({{"seconds": seconds, "error": error,
+                  "loaded": [m for m in {watched!r} if m in sys.modules]}}))
+"""
+
+def _measure_once(module: str, importtime: bool = False) -> (dict, str):
+    command = [sys.executable]
+    if importtime:
+        command += ["-X", "importtime"]
+    command += ["-c", _CHILD.format(module=module, watched=HEAVY + UI)]
+    done = subprocess.run(command, cwd=REPO_ROOT, capture_output=True, text=True, check=False)
+    lines = done.stdout.strip().splitlines()
+    if done.returncode != 0 or not lines:
+        return {"seconds": None, "error": (done.stderr.strip().splitlines() or ["no output"])[-1], "loaded": []}, ""
+    return json.loads(lines[-1]), done.stderr
+
+def _heaviest(importtime_log: str, module: str, top: int) -> list:
+    """The `top` imports of `module` with the largest cumulative time, from a `-X importtime` log."""
+    entries = []
+    # Interpreter startup is logged before the marker the harness prints.
+    importtime_log = importtime_log.split("--- start ---", 1)[-1]
+    for line in importtime_log.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        if not cumulative.isdigit():
+            continue
+        if name == module:  # the module's own line ends its import; later lines are the harness's
+            break
+        entries.append((int(cumulative), name))
+    # Only top-level entries, so a package and its own submodules are not listed twice.
+    names = {name for _, name in entries}
+    entries = [(us, name) for us, name in entries
+               if not any(name.startswith(parent + ".") for parent in names if parent != name)]
+    return [f"{name} {us / 1000:.0f}ms" for us, name in sorted(entries, reverse=True)[:top]]
+
+def measure(module: str, repeat: int = 5, top: int = 0) -> dict:
+    """Median and best cold import time of `module` over `repeat` fresh interpreters."""
+    runs = [_measure_once(module)[0] for _ in range(repeat)]
+    times = [run["seconds"] for run in runs if run["seconds"] is not None]
+    last = runs[-1]
+    row = {"module": module}
+    if last["error"] or not times:
+        row["error"] = last["error"] or "no successful run"
+    if times:
+        row["median_ms"] = round(statistics.median(times) * 1000, 1)
+        row["best_ms"] = round(min(times) * 1000, 1)
+    row["heavy"] = ",".join(m for m in last["loaded"] if m in HEAVY) or "-"
+    row["ui"] = ",".join(m for m in last["loaded"] if m in UI) or "-"
+    if top:
+        _, log = _measure_once(module, importtime=True)
+        row["heaviest"] = "; ".join(_heaviest(log, module, top)) or "-"
+    return row
+
+def _print_table(rows: list):
+    columns = ["module", "median_ms", "best_ms", "heavy", "ui", "heaviest", "error"]
+    columns = [c for c in columns if any(c in row for row in rows)]
+    widths = {c: max(len(c), *(len(str(row.get(c, ""))) for row in rows)) for c in columns}
+    print("  ".join(c.ljust(widths[c]) for c in columns))
+    for row in rows:
+        print("  ".join(str(row.get(c, "")).ljust(widths[c]) for c in columns))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--only", nargs="+", help="modules to measure (default: all app modules)")
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters per module")
+    parser.add_argument("--top", type=int, default=0, help="also list each module's N slowest imports")
+    parser.add_argument("--output", help="also write the results as JSON to this file")
+    parser.add_argument("--check", action="store_true", help="exit with status 1 if a heavy library loads eagerly")
+    args = parser.parse_args(argv)
+
+    rows = []
+    for module in args.only or MODULES:
+        print(f"Importing {module}...", flush=True)
+        rows.append(measure(module, max(1, args.repeat), args.top))
+    print()
+    _print_table(rows)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"settings": vars(args), "python": sys.version.split()[0], "results": rows}, f, indent=2)
+    eager = [row["module"] for row in rows if row["heavy"] != "-"]
+    if args.check and eager:
+        print(f"\nHeavy libraries loaded at import time by: {', '.join(eager)}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,342 @@
+# benchmarks/run.py
+"""
+Offline throughput benchmarks against a local WordPress REST stand-in and a stub OpenAI model.
+
+    python -m benchmarks.run                      # every scenario at full size
+    python -m benchmarks.run --items 1000 --csv-mb 5 --pdf-pages 30 --only fetch update rollback
+
+Each scenario runs in its own process so that its peak RSS is measured in isolation; the
+fake server runs in this process and keeps its state across scenarios. Scratch files
+(journal, caches, logs, generated CSV/PDF) live in a temporary working directory.
+"""
+import argparse
+import base64
+import csv
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ENDPOINT = "posts"
+SCENARIOS = ("fetch", "update", "rollback", "create", "delete", "batch_update", "plan",
+             "scrape", "scrape_revalidate", "parse_csv", "stream_csv", "parse_pdf")
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def _percentiles(latencies: list) -> dict:
+    ordered = sorted(latencies)
+    if not ordered:
+        return {}
+    pick = lambda pct: ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+    return {"p50_ms": round(pick(50) * 1000, 2), "p95_ms": round(pick(95) * 1000, 2),
+            "p99_ms": round(pick(99) * 1000, 2)}
+
+def _http_percentiles() -> dict:
+    """Percentiles of the busiest HTTP route recorded by utils.metrics in this process."""
+    from utils import metrics
+    rows = [row for row in metrics.latency_summary() if row["metric"] == "http_request"]
+    if not rows:
+        return {}
+    row = max(rows, key=lambda r: r["count"])
+    return {"p50_ms": round(row["p50_s"] * 1000, 2), "p95_ms": round(row["p95_s"] * 1000, 2),
+            "p99_ms": round(row["p99_s"] * 1000, 2)}
+
+def _timed_pool(fn, work: list, workers: int) -> (list, int):
+    """Run fn over `work` with a thread pool; returns (latencies, failures). fn returns (ok, msg)."""
+    def timed(unit):
+        started = time.perf_counter()
+        ok, _ = fn(unit)
+        return time.perf_counter() - started, ok
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        outcomes = list(pool.map(timed, work))
+    return [latency for latency, _ in outcomes], sum(1 for _, ok in outcomes if not ok)
+
+# --- data generators (run in the parent) ---
+
+def make_csv(path: str, size_mb: int):
+    """Write a product-import CSV of roughly `size_mb` megabytes."""
+    target = size_mb * 1024 * 1024
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "title", "content", "price", "location", "status"])
+        row = 0
+        while f.tell() < target:
+            for _ in range(1000):
+                row += 1
+                writer.writerow([row, f"Imported listing {row}", f"Description of listing {row}. " * 4,
+                                 row % 5000, f"City {row % 50}", "publish"])
+
+def make_pdf(path: str, pages: int):
+    """Write a text PDF with `pages` pages (requires PyMuPDF)."""
+    import fitz
+    doc = fitz.open()
+    for number in range(pages):
+        page = doc.new_page()
+        text = "\n".join(f"Page {number + 1}, line {line}: the quick brown fox jumps over the lazy dog."
+                         for line in range(50))
+        page.insert_text((50, 50), text, fontsize=9)
+    doc.save(path)
+    doc.close()
+
+# --- scenarios (run in a worker process) ---
+
+def bench_fetch(ctx) -> dict:
+    from utils.wp_api import fetch_items
+    started = time.perf_counter()
+    items = fetch_items(ctx["api_base"], ctx["headers"], ENDPOINT)
+    elapsed = time.perf_counter() - started
+    return {"ops": len(items or []), "unit": "items", "seconds": elapsed, **_http_percentiles(),
+            "errors": 0 if items is not None else 1}
+
+def bench_update(ctx) -> dict:
+    from utils import journal
+    from utils.wp_api import update_item
+    op_id = journal.begin_operation(ctx["api_base"], ENDPOINT, label="benchmark update")
+    actions = [{"id": i, "action": "update", "changes": {"title": f"Benchmark title {i}"}}
+               for i in range(1, ctx["items"] + 1)]
+    started = time.perf_counter()
+    latencies, failures = _timed_pool(
+        lambda action: update_item(ctx["api_base"], ctx["headers"], ENDPOINT, action, op_id), actions, ctx["workers"])
+    return {"ops": len(actions), "unit": "updates", "seconds": time.perf_counter() - started,
+            **_percentiles(latencies), "errors": failures}
+
+def bench_rollback(ctx) -> dict:
+    from utils import journal
+    last = journal.last_operation(journal.site_of(ctx["api_base"]))
+    if not last:
+        return {"error": "no journaled operation to roll back (run the update scenario first)"}
+    entries = sum(1 for _ in journal.iter_entries(last["op_id"]))
+    started = time.perf_counter()
+    ok, msg = journal.rollback_operation(last["op_id"], ctx["api_base"], ctx["headers"], max_workers=ctx["workers"])
+    return {"ops": entries, "unit": "restores", "seconds": time.perf_counter() - started, **_http_percentiles(),
+            "errors": 0 if ok else msg}
+
+def bench_create(ctx) -> dict:
+    from utils import journal
+    from utils.wp_api import create_item
+    op_id = journal.begin_operation(ctx["api_base"], ENDPOINT, label="benchmark create")
+    actions = [{"id": "new", "action": "create",
+                "changes": {"title": f"Created {n}", "content": f"Body {n}", "status": "draft"}}
+               for n in range(ctx["items"])]
+    started = time.perf_counter()
+    latencies, failures = _timed_pool(
+        lambda action: create_item(ctx["api_base"], ctx["headers"], ENDPOINT, action, op_id), actions, ctx["workers"])
+    return {"ops": len(actions), "unit": "creates", "seconds": time.perf_counter() - started,
+            **_percentiles(latencies), "errors": failures}
+
+def bench_delete(ctx) -> dict:
+    from utils import journal
+    from utils.wp_api import delete_item
+    last = journal.last_operation(journal.site_of(ctx["api_base"]))
+    created = [entry["id"] for entry in journal.iter_entries(last["op_id"]) if entry["kind"] == "created"] \
+        if last else []
+    if not created:
+        return {"error": "no created items to delete (run the create scenario first)"}
+    op_id = journal.begin_operation(ctx["api_base"], ENDPOINT, label="benchmark delete")
+    actions = [{"id": item_id, "action": "delete"} for item_id in created]
+    started = time.perf_counter()
+    latencies, failures = _timed_pool(
+        lambda action: delete_item(ctx["api_base"], ctx["headers"], ENDPOINT, action, op_id), actions, ctx["workers"])
+    return {"ops": len(actions), "unit": "deletes", "seconds": time.perf_counter() - started,
+            **_percentiles(latencies), "errors": failures}
+
+def bench_batch_update(ctx) -> dict:
+    from utils.executor import execute_plan
+    actions = [{"id": i, "action": "update", "changes": {"excerpt": f"Batched excerpt {i}"}}
+               for i in range(1, ctx["items"] + 1)]
+    started = time.perf_counter()
+    results, summary = execute_plan(ctx["api_base"], ctx["headers"], ENDPOINT, actions,
+                                    max_workers=ctx["workers"], use_batch=True)
+    return {"ops": summary["total"], "unit": "updates", "seconds": time.perf_counter() - started,
+            **_percentiles([r["Latency (s)"] for r in results]), "errors": summary["failed"],
+            "note": f"{summary['unchanged']} unchanged, {summary['bytes_saved']} bytes saved by diffing"}
+
+def bench_plan(ctx) -> dict:
+    from utils.ai import plan_actions
+    from benchmarks.stub_openai import StubChatModel
+    items = [{"id": i, "title": {"rendered": f"Listing {i}"},
+              "content": {"rendered": f"<p>Item {i} description. " + "Lorem ipsum dolor sit amet. " * 20 + "</p>"}}
+             for i in range(1, ctx["items"] + 1)]
+    model = StubChatModel(latency=ctx["ai_latency"])
+    started = time.perf_counter()
+    plan = plan_actions("Append (revised) to every title", items, ENDPOINT, model=model, use_cache=False)
+    return {"ops": len(items), "unit": "items", "seconds": time.perf_counter() - started,
+            **_percentiles(model.calls), "errors": len(items) - len(plan.get("actions", [])),
+            "note": f"{len(model.calls)} model calls"}
+
+def _scrape(ctx, unit: str) -> dict:
+    from utils.scraper import scrape_website
+    urls = [f"{ctx['site']}/shop/page-{n}/" for n in range(ctx["scrape_pages"])]
+    def scrape(url):
+        result = scrape_website(url)
+        return "error" not in result, result
+    started = time.perf_counter()
+    latencies, failures = _timed_pool(scrape, urls, ctx["workers"])
+    return {"ops": len(urls), "unit": unit, "seconds": time.perf_counter() - started,
+            **_percentiles(latencies), "errors": failures}
+
+def bench_scrape(ctx) -> dict:
+    return _scrape(ctx, "pages")
+
+def bench_scrape_revalidate(ctx) -> dict:
+    """Second pass over the same pages: every fetch is a conditional GET answered with 304."""
+    return _scrape(ctx, "pages (304)")
+
+def bench_parse_csv(ctx) -> dict:
+    from utils.file_utils import parse_uploaded_file
+    started = time.perf_counter()
+    with open(ctx["csv_path"], "rb") as f:
+        result = parse_uploaded_file(f, "csv")
+    rows = len(result["content"] or [])
+    return {"ops": rows, "unit": "rows", "seconds": time.perf_counter() - started,
+            "bytes": os.path.getsize(ctx["csv_path"]), "errors": 0 if rows else 1}
+
+def bench_stream_csv(ctx) -> dict:
+    from utils.file_utils import iter_uploaded_batches
+    rows, latencies = 0, []
+    started = time.perf_counter()
+    with open(ctx["csv_path"], "rb") as f:
+        batch_started = time.perf_counter()
+        for batch in iter_uploaded_batches(f, "csv", batch_size=1000):
+            latencies.append(time.perf_counter() - batch_started)
+            rows += len(batch)
+            batch_started = time.perf_counter()
+    return {"ops": rows, "unit": "rows", "seconds": time.perf_counter() - started,
+            "bytes": os.path.getsize(ctx["csv_path"]), **_percentiles(latencies), "errors": 0,
+            "note": "latency per 1000-row batch"}
+
+def bench_parse_pdf(ctx) -> dict:
+    from utils.file_utils import iter_pdf_pages, parse_uploaded_file
+    started = time.perf_counter()
+    with open(ctx["pdf_path"], "rb") as f:
+        text = parse_uploaded_file(f, "pdf")["content"]
+    upload_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    with open(ctx["pdf_path"], "rb") as f:
+        pages = sum(1 for _ in iter_pdf_pages(f, max_pages=None, max_chars=None))
+    return {"ops": pages, "unit": "pages", "seconds": time.perf_counter() - started,
+            "bytes": os.path.getsize(ctx["pdf_path"]), "errors": 0 if text else 1,
+            "note": f"parse_uploaded_file (budgeted) {upload_seconds:.2f}s"}
+
+# --- driver ---
+
+def run_worker(args):
+    """Run one scenario in this process and write its result as JSON."""
+    sys.path.insert(0, REPO_ROOT)
+    os.chdir(args.workdir)
+    ctx = {
+        "site": args.site,
+        "api_base": args.site + "/wp-json/wp/v2",
+        "headers": {"Authorization": "Basic " + base64.b64encode(b"benchmark:xxxx xxxx xxxx xxxx").decode()},
+        "items": args.items,
+        "workers": args.workers,
+        "ai_latency": args.ai_latency,
+        "scrape_pages": args.scrape_pages,
+        "csv_path": os.path.join(args.workdir, "import.csv"),
+        "pdf_path": os.path.join(args.workdir, "document.pdf"),
+    }
+    try:
+        result = globals()[f"bench_{args.worker}"](ctx)
+    except Exception as e:
+        result = {"error": f"{type(e).__name__}: {e}"}
+    result["peak_rss_mb"] = _peak_rss_mb()
+    with open(os.path.join(args.workdir, f"{args.worker}.json"), "w", encoding="utf-8") as f:
+        json.dump(result, f)
+
+def _row(scenario: str, result: dict) -> dict:
+    if "error" in result:
+        return {"scenario": scenario, "error": result["error"], "peak_rss_mb": result.get("peak_rss_mb")}
+    seconds = result["seconds"]
+    row = {"scenario": scenario, "ops": result["ops"], "unit": result["unit"], "seconds": round(seconds, 2),
+           "ops_per_s": round(result["ops"] / seconds, 1) if seconds > 0 else None}
+    if result.get("bytes"):
+        row["mb_per_s"] = round(result["bytes"] / (1024 * 1024) / seconds, 1) if seconds > 0 else None
+    for key in ("p50_ms", "p95_ms", "p99_ms", "errors", "peak_rss_mb", "note"):
+        if key in result:
+            row[key] = result[key]
+    return row
+
+def _print_table(rows: list):
+    columns = ["scenario", "ops", "unit", "seconds", "ops_per_s", "mb_per_s", "p50_ms", "p95_ms", "p99_ms",
+               "errors", "peak_rss_mb", "note", "error"]
+    columns = [c for c in columns if any(c in row for row in rows)]
+    cells = [[str(row.get(c, "")) for c in columns] for row in rows]
+    widths = [max(len(c), *(len(r[i]) for r in cells)) for i, c in enumerate(columns)]
+    print("  ".join(c.ljust(w) for c, w in zip(columns, widths)))
+    for r in cells:
+        print("  ".join(v.ljust(w) for v, w in zip(r, widths)))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--items", type=int, default=10000, help="items seeded on the fake site")
+    parser.add_argument("--csv-mb", type=int, default=100, help="size of the generated CSV")
+    parser.add_argument("--pdf-pages", type=int, default=300, help="pages in the generated PDF")
+    parser.add_argument("--scrape-pages", type=int, default=500, help="pages scraped per scrape scenario")
+    parser.add_argument("--workers", type=int, default=8, help="client-side concurrency")
+    parser.add_argument("--latency", type=float, default=0.005, help="server latency per request (s)")
+    parser.add_argument("--throttle", type=float, default=0.002, help="fraction of requests answered with 429")
+    parser.add_argument("--ai-latency", type=float, default=0.2, help="stub model latency per call (s)")
+    parser.add_argument("--only", nargs="+", choices=SCENARIOS, help="run only these scenarios, in order")
+    parser.add_argument("--output", help="also write the results as JSON to this file")
+    parser.add_argument("--keep-workdir", action="store_true", help="keep scratch files for inspection")
+    parser.add_argument("--worker", choices=SCENARIOS, help=argparse.SUPPRESS)
+    parser.add_argument("--site", help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.worker:
+        return run_worker(args)
+
+    from benchmarks.fake_wp import FakeWordPress
+    scenarios = args.only or SCENARIOS
+    workdir = tempfile.mkdtemp(prefix="wpcm-bench-")
+    server = FakeWordPress(latency=args.latency, throttle_rate=args.throttle).start()
+    server.seed(ENDPOINT, args.items)
+    rows = []
+    try:
+        if {"parse_csv", "stream_csv"} & set(scenarios):
+            print(f"Generating a {args.csv_mb} MB CSV...", flush=True)
+            make_csv(os.path.join(workdir, "import.csv"), args.csv_mb)
+        if "parse_pdf" in scenarios:
+            print(f"Generating a {args.pdf_pages}-page PDF...", flush=True)
+            try:
+                make_pdf(os.path.join(workdir, "document.pdf"), args.pdf_pages)
+            except ImportError as e:
+                print(f"Skipping PDF generation: {e}", flush=True)
+        for scenario in scenarios:
+            print(f"Running {scenario}...", flush=True)
+            forwarded = ["--items", str(args.items), "--workers", str(args.workers),
+                         "--ai-latency", str(args.ai_latency), "--scrape-pages", str(args.scrape_pages)]
+            subprocess.run([sys.executable, "-m", "benchmarks.run", "--worker", scenario, "--site", server.url,
+                            "--workdir", workdir] + forwarded, cwd=REPO_ROOT, check=False)
+            result_path = os.path.join(workdir, f"{scenario}.json")
+            if os.path.exists(result_path):
+                with open(result_path, encoding="utf-8") as f:
+                    rows.append(_row(scenario, json.load(f)))
+            else:
+                rows.append({"scenario": scenario, "error": "worker exited without a result"})
+    finally:
+        server.stop()
+        if not args.keep_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+    print()
+    print(f"Fake site: {args.items} items, {args.latency * 1000:.1f} ms latency, "
+          f"{args.throttle:.1%} throttled ({server.throttled} of {server.requests} requests answered 429)")
+    _print_table(rows)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"settings": {k: v for k, v in vars(args).items() if k not in ("worker", "site", "workdir")},
+                       "results": rows}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
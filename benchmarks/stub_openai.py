@@ -0,0 +1,45 @@
+# benchmarks/stub_openai.py
+import json
+import re
+import threading
+import time
+
+class StubChatModel:
+    """
+    Offline stand-in for OpenAIChatModel: proposes a title update for every item in the batch
+    it is shown, after `latency` seconds. stream() yields the reply in `fragment_chars` pieces,
+    `fragment_delay` seconds apart, like a token stream.
+    """
+
+    def __init__(self, latency: float = 0.0, fragment_chars: int = 40, fragment_delay: float = 0.0):
+        self.latency = latency
+        self.fragment_chars = fragment_chars
+        self.fragment_delay = fragment_delay
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def _reply(self, messages: list) -> str:
+        match = re.search(r"^Items \([^)]*\): (.*)$", messages[-1]["content"], re.M)
+        items = json.loads(match.group(1)) if match else []
+        actions = [{"id": item["id"], "action": "update", "changes": {"title": f"{item.get('title', '')} (revised)"}}
+                   for item in items]
+        return json.dumps({"actions": actions})
+
+    def complete(self, messages: list, max_tokens: int) -> str:
+        started = time.perf_counter()
+        time.sleep(self.latency)
+        reply = self._reply(messages)
+        with self._lock:
+            self.calls.append(time.perf_counter() - started)
+        return reply
+
+    def stream(self, messages: list, max_tokens: int):
+        started = time.perf_counter()
+        time.sleep(self.latency)
+        reply = self._reply(messages)
+        for start in range(0, len(reply), self.fragment_chars):
+            if self.fragment_delay:
+                time.sleep(self.fragment_delay)
+            yield reply[start:start + self.fragment_chars]
+        with self._lock:
+            self.calls.append(time.perf_counter() - started)
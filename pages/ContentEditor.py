@@ -1,10 +1,14 @@
 # pages/1_ContentEditor.py
 import streamlit as st
-import requests, time, re, json, pandas as pd
-from utils.wp_api import fetch_items, update_item, create_item, delete_item
-from utils.ai import process_prompt_via_openai
-from utils.file_utils import parse_csv, parse_excel, parse_text
-from utils.scraper import scrape_website
+import json
+from utils import jobs, mirror
+from utils.ai import OpenAIChatModel, plan_actions, stream_plan_actions
+from utils.auth import load_sites
+from utils.multisite import plan_across_sites, summarize_sites
+from utils.file_utils import parse_csv, iter_uploaded_batches, iter_row_actions, read_header
+from utils.scraper import scrape_websites
+from utils.media import upload_images
+from utils.ingest import ingest_files
 
 st.header("Content Editor")
 st.markdown("Enter your natural language command to create, update, or delete content on your active WordPress site.")
@@ -22,60 +26,349 @@ def get_wp_headers(site):
     return {"Authorization": f"Basic {token}"}
 wp_headers = get_wp_headers(wp_site)
 
+# Held once per server process instead of being rebuilt on every rerun. Heavy libraries
+# (pandas, PyMuPDF, python-docx, Pillow, BeautifulSoup, openai) load only when first used.
+@st.cache_resource
+def get_planner_model():
+    return OpenAIChatModel()
+
+@st.cache_resource
+def start_job_workers():
+    jobs.start_workers()
+    return True
+start_job_workers()
+
 nl_command = st.text_area("Enter Command", placeholder="E.g., 'Create a new post titled \"How to buy property in Spain\" with content ...'")
 
 uploaded_files = st.file_uploader("Upload Reference Files", 
                                   type=["jpg", "jpeg", "png", "csv", "xlsx", "json", "pdf", "docx", "txt"], 
                                   accept_multiple_files=True)
+file_context = []
 if uploaded_files:
     st.markdown("**Uploaded Files:**")
-    for f in uploaded_files:
-        st.write(f"- {f.name}")
+    with st.spinner("Parsing uploaded files..."):
+        file_context = ingest_files(uploaded_files)
+    for f, parsed in zip(uploaded_files, file_context):
+        st.write(f"- {f.name}" + (f" (could not parse: {parsed['error']})" if "error" in parsed else ""))
+
+# Optional URLs for additional web scraping context
+scrape_urls = st.text_area("Optional: URLs to scrape for extra content (one per line)", "")
+url_column = st.text_input("Optional: CSV column containing more URLs to scrape", "")
+SCRAPED_TEXT_CHARS = 2000  # per page, to keep the AI prompt bounded
+
+with st.expander("Local content mirror"):
+    for endpoint in mirror.MIRRORED_ENDPOINTS:
+        mirror_age = mirror.age(api_base, endpoint)
+        st.write(f"- {endpoint}: " + ("never synced" if mirror_age is None else f"synced {mirror_age:.0f}s ago"))
+    if st.button("Refresh Mirror"):
+        with st.spinner("Syncing mirror..."):
+            for endpoint in mirror.MIRRORED_ENDPOINTS:
+                try:
+                    stats = mirror.sync(api_base, wp_headers, endpoint)
+                    st.write(f"{endpoint}: {stats['updated']} updated, {stats['deleted']} deleted.")
+                except Exception as e:
+                    st.warning(f"{endpoint}: sync failed ({e}).")
+
+use_batch = st.checkbox("Use the WordPress batch endpoint (25 actions per request)", value=True)
+LOG_ROWS = 200  # most recent results shown in the Execution Log
+apply_while_planning = st.checkbox("Apply actions as soon as the AI proposes them (skip review)", value=False)
+use_search = st.checkbox("Only send items matching the command to the AI (local search index)", value=True)
+search_text = st.text_input("Optional: search terms for selecting items (defaults to the command)", "")
+
+
+image_files = [f for f in uploaded_files or [] if f.name.lower().rsplit(".", 1)[-1] in ("jpg", "jpeg", "png")]
+if image_files:
+    with st.expander("Upload images to the Media Library"):
+        image_format = st.selectbox("Format", ["JPEG", "WEBP"])
+        max_dimension = st.number_input("Maximum width/height (px)", min_value=320, max_value=4096, value=1920, step=80)
+        if st.button("Upload Images"):
+            with st.spinner("Resizing and uploading images..."):
+                media_results = upload_images(api_base, wp_headers, image_files,
+                                              max_size=(int(max_dimension), int(max_dimension)), fmt=image_format)
+            st.table(media_results)
+            st.session_state["media_ids"] = [{"file": r["file"], "id": r["id"], "source_url": r["source_url"]}
+                                             for r in media_results if r["id"]]
+    if st.session_state.get("media_ids"):
+        st.caption("Uploaded media ids are included in the AI prompt: "
+                   + ", ".join(str(m["id"]) for m in st.session_state["media_ids"]))
 
-# Optional URL for additional web scraping context
-scrape_url = st.text_input("Optional: Enter a URL to scrape for extra content", "")
+tabular_files = [f for f in uploaded_files or [] if f.name.lower().rsplit(".", 1)[-1] in ("csv", "xlsx")]
+if tabular_files:
+    with st.expander("Bulk import rows as WordPress items"):
+        import_file = st.selectbox("File", tabular_files, format_func=lambda f: f.name)
+        import_endpoint = st.selectbox("Content type", mirror.MIRRORED_ENDPOINTS)
+        mapping_text = st.text_input("Column mapping (file_column:wp_field, ...)", "title:title, content:content")
+        id_column = st.text_input("Optional: column with existing item ids (rows with an id are updated)", "")
+        batch_size = st.number_input("Rows per batch", min_value=25, max_value=5000, value=500, step=25)
+        if st.button("Import Rows"):
+            column_map = dict(pair.split(":", 1) for pair in
+                              (p.strip() for p in mapping_text.split(",")) if ":" in pair)
+            column_map = {k.strip(): v.strip() for k, v in column_map.items()}
+            usecols = list(column_map) + ([id_column.strip()] if id_column.strip() else [])
+            extension = import_file.name.lower().rsplit(".", 1)[-1]
+            import_file.seek(0)
+            try:
+                header = read_header(import_file, extension)
+            except Exception as e:
+                st.error(f"Could not read the columns of {import_file.name}: {e}")
+                st.stop()
+            missing = [column for column in usecols if column not in header]
+            if missing:
+                st.error(f"{import_file.name} has no column {', '.join(missing)}. "
+                         f"Available columns: {', '.join(header)}.")
+                st.stop()
+            batches = iter_uploaded_batches(import_file, extension, batch_size=int(batch_size),
+                                            usecols=usecols, dtype=str if extension == "csv" else None)
+            actions = (action for batch in iter_row_actions(batches, column_map, id_column.strip() or None)
+                       for action in batch)
+            with st.spinner("Queueing rows..."):
+                try:
+                    job_id = jobs.submit_job(wp_site, import_endpoint, actions, label=f"Import {import_file.name}",
+                                             use_batch=use_batch)
+                except Exception as e:
+                    st.error(f"Could not queue the import: {e}")
+                    st.stop()
+            st.success(f"Import queued as job {job_id[:8]}. Track it under Background Jobs below.")
+
+def detect_endpoint(command):
+    """Determine the target endpoint by keywords."""
+    lc = command.lower()
+    if "listing" in lc:
+        return "hp_listing"
+    elif "page" in lc:
+        return "pages"
+    elif "delete" in lc:
+        return "posts"  # default deletion target
+    else:
+        return "posts"
+
+def narrow_items(site_api_base, endpoint, items, command):
+    """Keep the items the local search index matches for the command; returns (items, search details)."""
+    if not use_search:
+        return items, None
+    candidate_ids, details = mirror.search(site_api_base, endpoint, search_text.strip() or command)
+    if candidate_ids is None:
+        return items, details
+    return [item for item in items if item["id"] in candidate_ids], details
+
+def build_prompt(command):
+    """The command plus scraped pages, parsed files and uploaded media as extra context."""
+    urls = scrape_urls.splitlines()
+    if url_column.strip() and uploaded_files:
+        for f in uploaded_files:
+            if f.name.lower().endswith(".csv"):
+                df = parse_csv(f)
+                if df is not None and url_column.strip() in df.columns:
+                    urls += df[url_column.strip()].dropna().astype(str).tolist()
+                f.seek(0)
+    extra_context = scrape_websites(urls) if any(url.strip() for url in urls) else {}
+    for page in extra_context.values():
+        if "text" in page:
+            page["text"] = page["text"][:SCRAPED_TEXT_CHARS]
+    if file_context:
+        extra_context["files"] = [c for c in file_context if "error" not in c]
+    if st.session_state.get("media_ids"):
+        extra_context["uploaded_media"] = st.session_state["media_ids"]
+    return command + "\nExtra context: " + json.dumps(extra_context)
+
+saved_sites = load_sites()
+if len(saved_sites) > 1:
+    with st.expander("Run the command on multiple sites"):
+        fanout_urls = st.multiselect("Sites", [site["site_url"] for site in saved_sites])
+        planning = st.radio("Planning", ["Plan once on the active site (items are matched by slug)",
+                                         "Plan separately for each site"])
+        plan_per_site = planning.startswith("Plan separately")
+        max_sites = st.slider("Sites planned in parallel", min_value=1, max_value=16, value=8)
+        if st.button("Plan on Selected Sites"):
+            if not nl_command.strip() or not fanout_urls:
+                st.error("Enter a command and select at least one site.")
+                st.stop()
+            fanout_sites = [site for site in saved_sites if site["site_url"] in fanout_urls]
+            fanout_endpoint = detect_endpoint(nl_command)
+            override = st.session_state.get("ai_override")
+            with st.spinner("Planning for the selected sites..."):
+                fanout_prompt = build_prompt(nl_command)
+                source_items, fanout_actions, planner = None, None, None
+                partial_sites = []
+
+                def plan_site_items(site, items):
+                    plan = plan_actions(fanout_prompt, narrow_items(site["site_url"] + "/wp-json/wp/v2",
+                                                                    fanout_endpoint, items, nl_command)[0],
+                                        fanout_endpoint, model=get_planner_model(), override=override)
+                    if plan.get("failed_chunks"):
+                        partial_sites.append(site["site_url"])
+                    return plan["actions"]
+
+                if plan_per_site:
+                    planner = plan_site_items
+                else:
+                    source_items, _ = narrow_items(api_base, fanout_endpoint,
+                                                   mirror.ensure_fresh(api_base, wp_headers, fanout_endpoint),
+                                                   nl_command)
+                    fanout_plan = plan_actions(fanout_prompt, source_items, fanout_endpoint,
+                                               model=get_planner_model(), override=override)
+                    fanout_actions = fanout_plan["actions"]
+                    if fanout_plan.get("failed_chunks"):
+                        partial_sites.append(wp_site["site_url"])
+                site_plans = plan_across_sites(fanout_sites, fanout_endpoint, actions=fanout_actions,
+                                               planner=planner, source_items=source_items, max_sites=max_sites)
+            if partial_sites:
+                st.warning("AI planning failed for part of the items of " + ", ".join(partial_sites)
+                           + "; those items have no actions in the plan. Review it before applying.")
+            # Kept in session state so the plans survive the rerun triggered by the Apply button.
+            st.session_state["pending_fanout"] = {"endpoint": fanout_endpoint, "command": nl_command,
+                                                  "plans": site_plans}
+
+pending_fanout = st.session_state.get("pending_fanout")
+if pending_fanout:
+    fanout_plans = pending_fanout["plans"]
+    st.subheader("Pending Multi-Site Plan")
+    st.write(f"{sum(plan['planned'] for plan in fanout_plans)} proposed actions on {pending_fanout['endpoint']} "
+             f"across {len(fanout_plans)} sites for: {pending_fanout['command']}")
+    st.table([{"Site": plan["site"], "Planned": plan["planned"], "Unmatched": plan["unmatched"],
+               "Error": plan.get("error", "")} for plan in fanout_plans])
+    with st.expander("Review proposed actions per site"):
+        for plan in fanout_plans:
+            st.markdown(f"**{plan['site']}**")
+            st.json({"actions": plan["actions"]})
+    fanout_cols = st.columns(2)
+    if fanout_cols[0].button("Apply on All Sites"):
+        sites_by_url = {site["site_url"]: site for site in saved_sites}
+        # One background job per site: the sites run in parallel and a rerun does not stop them.
+        st.session_state["fanout_jobs"] = [
+            (plan["site"], jobs.submit_job(sites_by_url[plan["site"]], pending_fanout["endpoint"], plan["actions"],
+                                           label=f"{pending_fanout['command'][:60]} (multi-site)", use_batch=use_batch))
+            for plan in fanout_plans if plan["actions"] and plan["site"] in sites_by_url]
+        del st.session_state["pending_fanout"]
+        st.success(f"Queued {len(st.session_state['fanout_jobs'])} jobs, one per site. "
+                   "Track them under Multi-Site Jobs below.")
+    elif fanout_cols[1].button("Discard Multi-Site Plan"):
+        del st.session_state["pending_fanout"]
+        st.info("Multi-site plan discarded.")
+    else:
+        st.info("Review the plans above, then click 'Apply on All Sites' to commit them.")
+
+fanout_jobs = st.session_state.get("fanout_jobs")
+if fanout_jobs:
+    st.subheader("Multi-Site Jobs")
+    st.button("Refresh Multi-Site Status")
+    fanout_status = [(site_url, job) for site_url, job in
+                     ((site_url, jobs.get_job(job_id)) for site_url, job_id in fanout_jobs) if job]
+    fanout_summary = summarize_sites(fanout_status)
+    st.write(f"{fanout_summary['done']}/{fanout_summary['actions']} actions done on {fanout_summary['sites']} sites: "
+             f"{fanout_summary['succeeded']} succeeded, {fanout_summary['failed']} failed"
+             + (f"; slowest site {fanout_summary['slowest_site']} ({fanout_summary['slowest_site_s']:.1f}s)"
+                if fanout_summary["slowest_site"] else "") + ".")
+    st.table([{"Site": site_url, "Job": job["job_id"][:8], "Status": job["status"],
+               "Done": f"{job['done']}/{job['total']}", "Failed": job["failed"], "Error": job["error"] or ""}
+              for site_url, job in fanout_status])
+    with st.expander("Multi-site totals"):
+        st.json(fanout_summary)
+    if fanout_summary["sites_pending"] and st.button("Cancel Multi-Site Jobs"):
+        for _, job_id in fanout_jobs:
+            jobs.cancel_job(job_id)
+        st.info("Cancellation requested; each job stops after its current round of actions.")
 
 if st.button("Process Command"):
     if not nl_command.strip():
         st.error("Please enter a command.")
     else:
         with st.spinner("Processing command via AI..."):
-            # Determine target endpoint by keywords:
-            lc = nl_command.lower()
-            if "listing" in lc:
-                target_endpoint = "hp_listing"
-            elif "page" in lc:
-                target_endpoint = "pages"
-            elif "delete" in lc:
-                target_endpoint = "posts"  # default deletion target
-            else:
-                target_endpoint = "posts"
-            items = fetch_items(api_base, wp_headers, target_endpoint)
-            if items is None:
-                st.error("Failed to fetch items from WordPress.")
+            target_endpoint = detect_endpoint(nl_command)
+            try:
+                items = mirror.ensure_fresh(api_base, wp_headers, target_endpoint)
+            except Exception as e:
+                st.error(f"Failed to fetch items from WordPress ({e}).")
                 st.stop()
-            extra_context = {}
-            if scrape_url.strip():
-                extra_context = scrape_website(scrape_url.strip())
-            full_prompt = nl_command + "\nExtra context: " + json.dumps(extra_context)
-            plan = process_prompt_via_openai(full_prompt, items, target_endpoint)
-            st.subheader("Proposed Edits Summary")
-            st.json(plan)
-        if st.button("Apply These Changes"):
-            results = []
-            for action in plan.get("actions", []):
-                if action["action"] == "create":
-                    success, msg = create_item(api_base, wp_headers, target_endpoint, action)
-                elif action["action"] == "update":
-                    success, msg = update_item(api_base, wp_headers, target_endpoint, action)
-                elif action["action"] == "delete":
-                    success, msg = delete_item(api_base, wp_headers, target_endpoint, action)
-                else:
-                    success, msg = (False, "Unknown action")
-                results.append({"ID": action.get("id"), "Action": action.get("action"), "Result": msg})
-                time.sleep(0.2)
-            st.subheader("Execution Log")
-            st.table(pd.DataFrame(results))
-            st.success("Operations completed. Review the log above.")
+            st.caption(f"Using {len(items)} mirrored items (synced {mirror.age(api_base, target_endpoint):.0f}s ago).")
+            if use_search and target_endpoint == "hp_listing":
+                try:
+                    mirror.ensure_fresh(api_base, wp_headers, "hp_listing_category")  # term names for search
+                except Exception as e:
+                    st.caption(f"Listing category names are not searchable: sync failed ({e}).")
+            total_items = len(items)
+            items, search_details = narrow_items(api_base, target_endpoint, items, nl_command)
+            if search_details and len(items) < total_items:
+                price_range = " ".join(filter(None, [
+                    f"from {search_details['min_price']:,.0f}" if search_details["min_price"] is not None else "",
+                    f"up to {search_details['max_price']:,.0f}" if search_details["max_price"] is not None else ""]))
+                st.caption(f"Search matched {len(items)} of {total_items} items"
+                           f" (keywords: {', '.join(search_details['used']) or 'none'}"
+                           + (f"; price {price_range}" if price_range else "")
+                           + (f"; ignored: {', '.join(search_details['ignored'])}" if search_details["ignored"] else "")
+                           + ").")
+            elif search_details and search_details["no_match"]:
+                st.caption(f"Search matched no items; all {total_items} items are sent to the AI.")
+            full_prompt = build_prompt(nl_command)
+        st.subheader("Proposed Edits Summary")
+        preview = st.empty()
+        planned = []
+
+        def previewed(stream):
+            for action in stream:
+                planned.append(action)
+                if len(planned) % 5 == 1:
+                    preview.json({"actions": planned})
+                yield action
+            preview.json({"actions": planned})
+
+        failed_chunks = []
+        stream = previewed(stream_plan_actions(full_prompt, items, target_endpoint,
+                                               model=get_planner_model(),
+                                               override=st.session_state.get("ai_override"),
+                                               failed_chunks=failed_chunks))
+        if apply_while_planning:
+            # Each action is queued as soon as it is proposed; workers apply it in the background.
+            job_id = jobs.submit_job(wp_site, target_endpoint, stream, label=nl_command[:80], use_batch=use_batch,
+                                     stream=True)
+            st.success(f"Actions were queued as job {job_id[:8]} while being planned. "
+                       "Track it under Background Jobs below.")
         else:
-            st.info("Review the proposed edits above, then click 'Apply These Changes' to commit.")
+            for _ in stream:
+                pass
+            # Kept in session state so the plan survives the rerun triggered by the Apply button.
+            st.session_state["pending_plan"] = {"site": wp_site["site_url"], "endpoint": target_endpoint,
+                                                "command": nl_command, "actions": planned}
+        if failed_chunks:
+            st.warning(f"AI planning failed for {len(failed_chunks)} batch(es) of items "
+                       f"({', '.join(str(index + 1) for index in sorted(failed_chunks))}); "
+                       "those items have no actions in the plan.")
+
+pending_plan = st.session_state.get("pending_plan")
+if pending_plan and pending_plan["site"] == wp_site["site_url"]:
+    st.subheader("Pending Plan")
+    st.write(f"{len(pending_plan['actions'])} proposed actions on {pending_plan['endpoint']} "
+             f"for: {pending_plan['command']}")
+    with st.expander("Review proposed actions"):
+        st.json({"actions": pending_plan["actions"]})
+    plan_cols = st.columns(2)
+    if plan_cols[0].button("Apply These Changes"):
+        job_id = jobs.submit_job(wp_site, pending_plan["endpoint"], pending_plan["actions"],
+                                 label=pending_plan["command"][:80], use_batch=use_batch)
+        del st.session_state["pending_plan"]
+        st.success(f"Changes queued as job {job_id[:8]}. Track it under Background Jobs below.")
+    elif plan_cols[1].button("Discard Plan"):
+        del st.session_state["pending_plan"]
+        st.info("Plan discarded.")
+    else:
+        st.info("Review the proposed edits above, then click 'Apply These Changes' to commit.")
+
+site_jobs = jobs.list_jobs(wp_site["site_url"], limit=10)
+if site_jobs:
+    st.subheader("Background Jobs")
+    st.button("Refresh Job Status")
+    st.table([{"Job": job["job_id"][:8], "Label": job["label"], "Status": job["status"],
+              "Done": f"{job['done']}/{job['total']}", "Failed": job["failed"],
+              "Created": job["created_at"]} for job in site_jobs])
+    selected_job = st.selectbox("Job details", site_jobs,
+                                format_func=lambda job: f"{job['job_id'][:8]} {job['label'] or ''}")
+    st.progress(selected_job["progress"])
+    if selected_job["error"]:
+        st.error(selected_job["error"])
+    if selected_job["summary"]:
+        st.json(selected_job["summary"])
+    if selected_job["failed"]:
+        st.table(jobs.job_results(selected_job["job_id"], state="failed", limit=LOG_ROWS))
+    if selected_job["status"] in ("queued", "running") and st.button("Cancel Job"):
+        jobs.cancel_job(selected_job["job_id"])
+        st.info("Cancellation requested; the job stops after its current round of actions.")
@@ -1,7 +1,5 @@
 # pages/2_OwnerPanel.py
 import streamlit as st
-import json
-import pandas as pd
 from utils.auth import load_sites
 from utils.logger import get_recent_errors
 
@@ -27,6 +25,37 @@ if st.button("Revert to Default Code"):
         del st.session_state["ai_override"]
     st.success("Reverted to default functionality.")
 
+st.subheader("AI Plan Cache")
+from utils import ai_cache
+st.json(ai_cache.stats())
+if st.button("Clear AI Cache"):
+    ai_cache.clear()
+    st.success("AI plan cache cleared.")
+
+st.subheader("Performance")
+from utils import metrics
+latencies = metrics.latency_summary()
+if latencies:
+    st.markdown("**Latency (p50 / p95 / p99)**")
+    st.table(latencies)
+    st.markdown("**Slowest operations**")
+    st.table(metrics.slowest_operations())
+    counters = metrics.counter_summary()
+    if counters:
+        st.markdown("**Counters**")
+        st.table(counters)
+    st.download_button("Download Prometheus Metrics", metrics.to_prometheus(), file_name=metrics.METRICS_FILE,
+                       mime="text/plain")
+    metric_cols = st.columns(2)
+    if metric_cols[0].button("Export Metrics File"):
+        metrics.export()
+        st.success(f"Metrics written to {metrics.METRICS_FILE}.")
+    if metric_cols[1].button("Reset Metrics"):
+        metrics.reset()
+        st.success("Metrics reset.")
+else:
+    st.info("No requests recorded yet.")
+
 st.subheader("Saved Site Credentials")
 sites = load_sites()
 if sites:
@@ -35,19 +64,46 @@ else:
     st.write("No sites saved.")
 
 st.subheader("Recent Error Log")
-errors = get_recent_errors()
+filter_cols = st.columns(4)
+log_site = filter_cols[0].text_input("Site", "")
+log_endpoint = filter_cols[1].text_input("Endpoint", "")
+log_status = filter_cols[2].text_input("HTTP status", "")
+log_limit = filter_cols[3].number_input("Records", min_value=1, max_value=1000, value=10)
+log_filters = {k: v.strip() for k, v in {"site": log_site, "endpoint": log_endpoint, "status": log_status}.items()
+               if v.strip()}
+errors = get_recent_errors(int(log_limit), **log_filters)
 if errors:
-    st.table(pd.DataFrame(errors))
+    st.table(errors)
 else:
     st.info("No errors logged.")
 
 st.subheader("Rollback Changes")
-if st.button("Rollback Last Operation"):
-    from utils.wp_api import rollback_last_operation
-    success, msg = rollback_last_operation()
-    if success:
-        st.success("Rollback successful.")
+active_site = st.session_state.get("active_site")
+if active_site:
+    from utils import journal
+    from utils.wp_api import rollback_operation, rollback_last_operation
+    page_size = 20
+    page = st.number_input("Journal page", min_value=1, value=1, step=1)
+    operations = journal.list_operations(journal.site_of(active_site["site_url"]),
+                                         limit=page_size, offset=(page - 1) * page_size)
+    if operations:
+        st.table(operations)
+        selected_op = st.selectbox("Operation to roll back", [op["op_id"] for op in operations])
+        if st.button("Rollback Selected Operation"):
+            success, msg = rollback_operation(selected_op)
+            if success:
+                st.success(f"Rollback successful. {msg}")
+            else:
+                st.error(f"Rollback failed: {msg}")
     else:
-        st.error(f"Rollback failed: {msg}")
+        st.info("No journaled operations for this site.")
+    if st.button("Rollback Last Operation"):
+        success, msg = rollback_last_operation()
+        if success:
+            st.success(f"Rollback successful. {msg}")
+        else:
+            st.error(f"Rollback failed: {msg}")
+else:
+    st.info("Select an active site to view its rollback journal.")
 
 st.markdown("**Note:** Only the Owner can modify system settings and trigger rollbacks.")
@@ -0,0 +1,77 @@
+# tests/test_ai.py
+import json
+import re
+import pytest
+from utils import ai
+
+def _feed(parser, text, size):
+    actions = []
+    for start in range(0, len(text), size):
+        actions += parser.feed(text[start:start + size])
+    return actions
+
+PLAN = {"actions": [
+    {"id": 1, "action": "update", "changes": {"title": "Braces } and \" quotes {"}},
+    {"id": "new", "action": "create", "changes": {"meta": {"hp_price": 100}}},
+]}
+
+@pytest.mark.parametrize("size", [1, 7, 1000])
+def test_parser_yields_each_action_across_fragments(size):
+    assert _feed(ai.ActionStreamParser(), json.dumps(PLAN), size) == PLAN["actions"]
+
+def test_parser_ignores_code_fences_and_surrounding_text():
+    reply = "Here is the plan:\n```json\n" + json.dumps(PLAN, indent=2) + "\n```\nDone."
+    assert _feed(ai.ActionStreamParser(), reply, 5) == PLAN["actions"]
+
+def test_parser_drops_an_action_cut_off_mid_object():
+    reply = json.dumps(PLAN)
+    truncated = reply[:reply.index('{"id": "new"') + 20]
+    assert _feed(ai.ActionStreamParser(), truncated, 3) == PLAN["actions"][:1]
+
+class ChunkModel:
+    """Updates every item it is shown; fails on `fail_id` and truncates replies over `limit` items."""
+
+    def __init__(self, limit=100, fail_id=None):
+        self.limit, self.fail_id, self.calls = limit, fail_id, []
+
+    def complete(self, messages, max_tokens):
+        content = messages[-1]["content"]
+        ids = [item["id"] for item in json.loads(re.search(r"items\): (\[.*\])\n", content).group(1))]
+        self.calls.append(len(ids))
+        if self.fail_id in ids:
+            raise RuntimeError("model error")
+        if len(ids) > self.limit:
+            raise ai.ReplyTruncated("cut off")
+        actions = [{"id": i, "action": "update", "changes": {"title": f"T{i}"}} for i in ids]
+        if "Do not propose 'create'" not in content:
+            actions.append({"id": "new", "action": "create", "changes": {"title": "New"}})
+        return json.dumps({"actions": actions})
+
+ITEMS = [{"id": i, "title": {"rendered": f"Item {i}"}} for i in range(1, 41)]
+
+def test_failed_chunks_are_reported():
+    plan = ai.plan_actions("Retitle", ITEMS, "posts", model=ChunkModel(fail_id=33), token_budget=150,
+                           use_cache=False)
+    assert plan["failed_chunks"] == [1]
+    assert 33 not in {action["id"] for action in plan["actions"]}
+    assert {action["id"] for action in plan["actions"]} >= {1, 2}
+
+def test_truncated_chunks_are_split_and_retried():
+    model = ChunkModel(limit=6)
+    plan = ai.plan_actions("Retitle", ITEMS, "posts", model=model, token_budget=150, use_cache=False)
+    assert plan["failed_chunks"] == []
+    assert sorted(a["id"] for a in plan["actions"] if a["action"] == "update") == list(range(1, 41))
+    assert sum(a["action"] == "create" for a in plan["actions"]) == 1
+    assert any(n > model.limit for n in model.calls)  # some replies were cut off and split
+
+def test_streamed_plan_reports_failed_chunks():
+    failed = []
+    actions = list(ai.stream_plan_actions("Retitle", ITEMS, "posts", model=ChunkModel(fail_id=33), token_budget=150,
+                                          use_cache=False, failed_chunks=failed))
+    assert failed == [1]
+    assert 33 not in {action["id"] for action in actions}
+
+def test_prompt_counts_against_the_chunk_budget():
+    assert ai.item_budget("short") == ai.CHUNK_TOKEN_BUDGET - ai.estimate_tokens("short")
+    assert ai.item_budget("x" * 4000, override="y" * 4000) == ai.CHUNK_TOKEN_BUDGET - 2001
+    assert ai.item_budget("x" * 100000) == ai.CHUNK_TOKEN_BUDGET // 4
@@ -0,0 +1,47 @@
+# tests/test_ai_cache.py
+import pytest
+from utils import ai_cache
+
+@pytest.fixture(autouse=True)
+def cache_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(ai_cache, "CACHE_FILE", str(tmp_path / "cache.db"))
+    yield
+    conn = getattr(ai_cache._local, "conn", None)
+    if conn is not None:
+        conn.close()
+        ai_cache._local.conn = None
+
+def test_key_collapses_whitespace_only():
+    key = ai_cache.make_key("Create post titled 'Hello World'", "posts", "f")
+    assert ai_cache.make_key("  Create post   titled 'Hello World'\n", "posts", "f") == key
+    assert ai_cache.make_key("Create post titled 'hello world'", "posts", "f") != key
+
+@pytest.mark.parametrize("content_type, items, override", [("pages", "f", None), ("posts", "g", None),
+                                                           ("posts", "f", "Write in Spanish")])
+def test_key_covers_content_type_items_and_override(content_type, items, override):
+    assert ai_cache.make_key("Retitle", content_type, items, override) != ai_cache.make_key("Retitle", "posts", "f")
+
+def test_get_returns_stored_plan_and_counts_lookups():
+    assert ai_cache.get("key") is None
+    ai_cache.put("key", {"actions": [{"id": 1}]})
+    assert ai_cache.get("key") == {"actions": [{"id": 1}]}
+    assert ai_cache.stats()["hits"] == 1
+    assert ai_cache.stats()["misses"] == 1
+
+def test_expired_plans_are_misses():
+    ai_cache.put("key", {"actions": []})
+    assert ai_cache.get("key", ttl=-1) is None
+    assert ai_cache.stats()["entries"] == 0
+
+def test_least_recently_used_plans_are_evicted_beyond_max_bytes(monkeypatch):
+    clock = iter(range(100))
+    monkeypatch.setattr(ai_cache.time, "time", lambda: next(clock))
+    plan = {"actions": [{"id": i, "action": "update", "changes": {"title": f"Title {i}"}} for i in range(50)]}
+    ai_cache.put("a", plan)
+    ai_cache.put("b", plan)
+    ai_cache.get("a")  # "b" is now the least recently used
+    size = ai_cache.stats()["bytes"] // 2
+    ai_cache.put("c", plan, max_bytes=2 * size)
+    assert ai_cache.get("a") == plan
+    assert ai_cache.get("b") is None
+    assert ai_cache.get("c") == plan
@@ -0,0 +1,40 @@
+# tests/test_diff.py
+from utils.diff import changed_fields, minimize_actions
+
+def test_unchanged_raw_fields_are_dropped():
+    current = {"title": {"raw": "Hello", "rendered": "Hello"}, "status": "publish"}
+    assert changed_fields(current, {"title": "Hello", "status": "publish"}) == {}
+
+def test_changed_and_missing_fields_are_kept():
+    current = {"title": {"raw": "Hello", "rendered": "Hello"}}
+    assert changed_fields(current, {"title": "Hi", "excerpt": "New"}) == {"title": "Hi", "excerpt": "New"}
+
+def test_rendered_only_field_counts_as_changed():
+    # A view-context item: the stored raw content may differ from the rendered HTML.
+    current = {"content": {"rendered": "<p>Text</p>"}}
+    assert changed_fields(current, {"content": "<p>Text</p>"}) == {"content": "<p>Text</p>"}
+
+def test_meta_is_compared_key_by_key():
+    current = {"meta": {"price": "100", "city": "Malaga"}}
+    assert changed_fields(current, {"meta": {"price": 100, "city": "Marbella"}}) == {"meta": {"city": "Marbella"}}
+
+def test_term_lists_ignore_order_and_type():
+    assert changed_fields({"categories": [3, 1]}, {"categories": ["1", "3"]}) == {}
+
+def test_whitespace_and_line_endings_are_normalized():
+    current = {"content": {"raw": "Line one\r\nLine two\n", "rendered": ""}}
+    assert changed_fields(current, {"content": "Line one\nLine two"}) == {}
+
+def test_minimize_actions_skips_noop_updates():
+    snapshots = {"1": {"title": {"raw": "Same"}}, "2": {"title": {"raw": "Old"}, "status": "draft"}}
+    actions = [
+        {"id": 1, "action": "update", "changes": {"title": "Same"}},
+        {"id": 2, "action": "update", "changes": {"title": "New", "status": "draft"}},
+        {"id": "new", "action": "create", "changes": {"title": "Created"}},
+        {"id": 3, "action": "update", "changes": {"title": "No snapshot"}},
+    ]
+    kept, skipped, saved = minimize_actions(actions, snapshots)
+    assert [a["id"] for a in skipped] == [1]
+    assert kept[0] == {"id": 2, "action": "update", "changes": {"title": "New"}}
+    assert kept[1:] == actions[2:]
+    assert saved > 0
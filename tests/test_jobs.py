@@ -0,0 +1,88 @@
+# tests/test_jobs.py
+import time
+import pytest
+from cryptography.fernet import Fernet
+from utils import auth, executor, jobs, journal
+
+SITE = {"site_url": "https://example.com", "username": "editor", "app_password": "secret"}
+
+@pytest.fixture(autouse=True)
+def job_db(tmp_path, monkeypatch):
+    key = Fernet.generate_key()
+    monkeypatch.setattr(auth, "get_fernet", lambda: Fernet(key))
+    monkeypatch.setattr(jobs, "JOBS_FILE", str(tmp_path / "jobs.db"))
+    monkeypatch.setattr(journal, "JOURNAL_FILE", str(tmp_path / "journal.db"))
+    monkeypatch.setattr(jobs, "start_workers", lambda: None)  # jobs are run in the test thread
+    yield
+    for module in (jobs, journal):
+        conn = getattr(module._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            module._local.conn = None
+
+@pytest.fixture
+def created(monkeypatch):
+    """Replace item creation: titles starting with "slow" succeed late, "bad" fails at once."""
+    titles = []
+
+    def create_item(api_base, headers, endpoint, action, op_id=None):
+        title = action["changes"]["title"]
+        titles.append(title)
+        if title.startswith("bad"):
+            return False, "HTTP 400: Invalid title."
+        if title.startswith("slow"):
+            time.sleep(0.2)
+        return True, f"Created {title}"
+
+    monkeypatch.setattr(executor, "create_item", create_item)
+    return titles
+
+def _create(title):
+    return {"id": "new", "action": "create", "changes": {"title": title}}
+
+def _run_next():
+    job = jobs._claim_next()
+    assert job is not None
+    jobs._run_job(job)
+    return jobs.get_job(job["job_id"])
+
+def test_results_are_checkpointed_by_sequence_number(created):
+    job_id = jobs.submit_job(SITE, "posts", [_create("slow one"), _create("bad two")], max_workers=2)
+    job = _run_next()
+    assert (job["status"], job["succeeded"], job["failed"]) == ("done", 1, 1)
+    assert [(row["seq"], row["State"], row["Result"]) for row in jobs.job_results(job_id)] == [
+        (0, "done", "Created slow one"), (1, "failed", "HTTP 400: Invalid title.")]
+
+def test_interrupted_job_resumes_with_pending_actions_only(created):
+    job_id = jobs.submit_job(SITE, "posts", [_create(f"post {n}") for n in range(3)])
+    # A previous process claimed the job and finished the first action before it died.
+    jobs._claim_next()
+    jobs._checkpoint(job_id, 0, True, "Created post 0")
+    assert jobs.recover_jobs() == 1
+    job = _run_next()
+    assert created == ["post 1", "post 2"]
+    assert (job["status"], job["done"], job["total"]) == ("done", 3, 3)
+    assert job["summary"]["total"] == 2
+    assert job["summary"]["operation_id"] == job["op_id"]
+
+def test_failing_submission_marks_the_job_failed():
+    def rows():
+        yield _create("first")
+        raise ValueError("Usecols do not match columns")
+
+    with pytest.raises(ValueError):
+        jobs.submit_job(SITE, "posts", rows())
+    job, = jobs.list_jobs()
+    assert job["status"] == "failed"
+    assert "Usecols" in job["error"]
+    assert jobs._claim_next() is None
+
+def test_streamed_job_is_sealed_when_the_producer_stops(created):
+    def plan():
+        yield _create("streamed")
+        raise RuntimeError("planner stopped")
+
+    with pytest.raises(RuntimeError):
+        jobs.submit_job(SITE, "posts", plan(), stream=True)
+    job = _run_next()
+    assert (job["status"], job["done"], job["total"], job["sealed"]) == ("done", 1, 1, 1)
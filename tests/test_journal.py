@@ -0,0 +1,36 @@
+# tests/test_journal.py
+import pytest
+from utils import journal
+
+API_BASE = "https://example.com/wp-json/wp/v2"
+
+@pytest.fixture(autouse=True)
+def journal_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(journal, "JOURNAL_FILE", str(tmp_path / "journal.db"))
+    yield
+    conn = getattr(journal._local, "conn", None)
+    if conn is not None:
+        conn.close()
+        journal._local.conn = None
+
+def _rollback(op_id):
+    return [(entry["kind"], entry["id"], entry["data"]) for entry in journal.rollback_entries(op_id)]
+
+def test_earliest_snapshot_wins():
+    op_id = journal.begin_operation(API_BASE, "posts")
+    journal.record_snapshots(op_id, API_BASE, "posts", {1: {"title": "original"}, 2: {"title": "two"}})
+    journal.record_snapshots(op_id, API_BASE, "posts", {1: {"title": "after round 1"}})
+    assert _rollback(op_id) == [("snapshot", "1", {"title": "original"}), ("snapshot", "2", {"title": "two"})]
+
+def test_created_items_are_deleted_not_restored():
+    op_id = journal.begin_operation(API_BASE, "posts")
+    journal.record_created(op_id, API_BASE, "posts", 9)
+    journal.record_snapshots(op_id, API_BASE, "posts", {9: {"title": "edited after creation"}})
+    journal.record_snapshots(op_id, API_BASE, "pages", {9: {"title": "a page with the same id"}})
+    assert _rollback(op_id) == [("created", "9", {}), ("snapshot", "9", {"title": "a page with the same id"})]
+
+def test_last_operation_skips_empty_operations():
+    recorded = journal.begin_operation(API_BASE, "posts")
+    journal.record_snapshots(recorded, API_BASE, "posts", {1: {"title": "original"}})
+    journal.begin_operation(API_BASE, "posts")  # an empty plan
+    assert journal.last_operation(journal.site_of(API_BASE))["op_id"] == recorded
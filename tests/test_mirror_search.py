@@ -0,0 +1,77 @@
+# tests/test_mirror_search.py
+import pytest
+from utils import mirror
+
+API_BASE = "https://example.com/wp-json/wp/v2"
+SITE = "https://example.com"
+
+@pytest.fixture(autouse=True)
+def mirror_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(mirror, "MIRROR_FILE", str(tmp_path / "mirror.db"))
+    yield
+    conn = getattr(mirror._local, "conn", None)
+    if conn is not None:
+        conn.close()
+        mirror._local.conn = None
+
+def _item(item_id, title, content="", **fields):
+    return dict({"id": item_id, "title": {"raw": title}, "content": {"raw": content}, "modified": "2024-01-01T00:00:00"},
+                **fields)
+
+@pytest.fixture
+def posts():
+    mirror._upsert(SITE, "posts", [
+        _item(1, "Buying property in Marbella", "A guide to the Costa del Sol."),
+        _item(2, "Moving to Malaga", "Schools, taxes and neighbourhoods."),
+        _item(3, "Ten tips for Spain", "Written in 2019."),
+    ])
+
+@pytest.fixture
+def listings():
+    mirror._upsert(SITE, "hp_listing_category", [{"id": 7, "name": "Villa"}])
+    mirror._upsert(SITE, "hp_listing", [
+        _item(10, "Sea view home in Marbella", hp_listing_category=[7], hp_price=450000),
+        _item(11, "Town house in Marbella", hp_price=900000),
+        _item(12, "Apartment in Madrid", hp_price=300000),
+        _item(13, "Villa plot in Malaga"),
+    ])
+
+def test_keywords_and_price_bound(listings):
+    ids, details = mirror.search(API_BASE, "hp_listing", "all villas in Marbella under 500k")
+    assert ids == {10}
+    assert details["used"] == ["villas", "marbella"]
+
+def test_taxonomy_term_names_match(listings):
+    ids, _ = mirror.search(API_BASE, "hp_listing", "update the villa listings")
+    assert ids == {10, 13}
+
+def test_unpriced_endpoint_ignores_price_bounds(posts):
+    ids, details = mirror.search(API_BASE, "posts", "posts about Marbella under 500k")
+    assert ids == {1}
+    assert details["max_price"] is None
+
+@pytest.mark.parametrize("command", [
+    "Add a summary to posts with more than 500 words",
+    "Rewrite posts from 2019",
+    "Update up to 5 posts about Spain",
+])
+def test_commands_without_price_never_narrow_to_nothing(posts, command):
+    ids, _ = mirror.search(API_BASE, "posts", command)
+    assert ids is None or ids
+
+def test_new_value_is_not_required_to_match(posts):
+    ids, details = mirror.search(API_BASE, "posts", "Change Marbella to Malaga in all titles")
+    assert ids == {1}
+    assert details["values"] == ["malaga"]
+
+def test_keywords_fall_back_to_any_match(posts):
+    ids, _ = mirror.search(API_BASE, "posts", "posts about Marbella and Malaga")
+    assert ids == {1, 2}
+
+def test_no_match_means_no_narrowing(listings):
+    ids, details = mirror.search(API_BASE, "hp_listing", "listings in Marbella over 5m")
+    assert ids is None
+    assert details["no_match"]
+
+def test_no_criteria(posts):
+    assert mirror.search(API_BASE, "posts", "rewrite everything")[0] is None
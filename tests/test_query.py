@@ -0,0 +1,55 @@
+# tests/test_query.py
+import pytest
+from utils.query import parse_amount, parse_command
+
+@pytest.mark.parametrize("number, unit, expected", [
+    ("500", "k", 500000.0),
+    ("1.2", "m", 1200000.0),
+    ("500,000", None, 500000.0),
+    ("500.000", None, 500000.0),
+    ("2,5", None, 2.5),
+])
+def test_parse_amount(number, unit, expected):
+    assert parse_amount(number, unit) == expected
+
+def test_keywords_and_max_price():
+    parsed = parse_command("all Spanish villa listings under 500k")
+    assert parsed["keywords"] == ["spanish", "villa"]
+    assert parsed["max_price"] == 500000.0
+    assert parsed["min_price"] is None
+
+def test_price_range_and_currency():
+    parsed = parse_command("apartments between 200k and 300k")
+    assert (parsed["min_price"], parsed["max_price"]) == (200000.0, 300000.0)
+    parsed = parse_command("villas from 300,000 euros")
+    assert parsed["min_price"] == 300000.0
+    assert parsed["keywords"] == ["villas"]
+
+def test_bare_price_followed_by_a_place():
+    parsed = parse_command("villas under 500000 in Marbella")
+    assert parsed["max_price"] == 500000.0
+    assert parsed["keywords"] == ["villas", "marbella"]
+
+@pytest.mark.parametrize("command", [
+    "Add a summary to posts with more than 500 words",
+    "Rewrite posts from 2019 about Marbella",
+    "Update up to 5 posts about Spain",
+])
+def test_counts_and_years_are_not_prices(command):
+    parsed = parse_command(command)
+    assert parsed["min_price"] is None
+    assert parsed["max_price"] is None
+
+def test_new_value_is_not_a_keyword():
+    for command in ("Change Marbella to Malaga in all titles", "Replace Marbella with Malaga in all titles"):
+        parsed = parse_command(command)
+        assert parsed["keywords"] == ["marbella"]
+        assert parsed["values"] == ["malaga"]
+
+def test_up_to_is_not_a_new_value():
+    assert parse_command("Update up to 5 posts about Spain")["keywords"] == ["spain"]
+
+def test_quoted_text_is_ignored():
+    parsed = parse_command('Create a post titled "Villas in Ibiza" about Mallorca')
+    assert "ibiza" not in parsed["keywords"]
+    assert "mallorca" in parsed["keywords"]
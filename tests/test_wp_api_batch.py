@@ -0,0 +1,59 @@
+# tests/test_wp_api_batch.py
+import pytest
+from benchmarks.fake_wp import FakeWordPress, BATCH_PATH
+from utils import wp_api
+
+@pytest.fixture(scope="module")
+def server():
+    server = FakeWordPress().start()
+    yield server
+    server.stop()
+
+@pytest.fixture
+def site(server, monkeypatch):
+    monkeypatch.setattr(wp_api, "_batch_support", {})
+    server.seed("posts", 5)
+    return server
+
+def _block_batch(server, status, monkeypatch):
+    handle, calls = server.handle, []
+
+    def blocked(method, path, query, body):
+        if path.startswith(BATCH_PATH):
+            calls.append(path)
+            return status, {}, {"code": "rest_forbidden", "message": "Blocked"}
+        return handle(method, path, query, body)
+
+    monkeypatch.setattr(server, "handle", blocked)
+    return calls
+
+def test_batch_applies_every_action(site):
+    first, second = sorted(site.items["posts"])[:2]
+    actions = [{"id": first, "action": "update", "changes": {"title": "Batched"}},
+               {"id": "new", "action": "create", "changes": {"title": "Created"}},
+               {"id": second, "action": "delete"}]
+    outcomes = wp_api.batch_items(site.api_base, {}, "posts", actions, backup=False)
+    assert [ok for ok, _ in outcomes] == [True, True, True]
+    assert site.items["posts"][first]["title"] == "Batched"
+    assert second not in site.items["posts"]
+
+@pytest.mark.parametrize("status", wp_api.BATCH_UNAVAILABLE)
+def test_unavailable_batch_route_falls_back_to_single_calls(site, status, monkeypatch):
+    calls = _block_batch(site, status, monkeypatch)
+    ids = sorted(site.items["posts"])[:2]
+    actions = [{"id": i, "action": "update", "changes": {"title": f"Single {i}"}} for i in ids]
+    outcomes = wp_api.batch_items(site.api_base, {}, "posts", actions, backup=False)
+    assert [ok for ok, _ in outcomes] == [True, True]
+    assert [site.items["posts"][i]["title"] for i in ids] == [f"Single {i}" for i in ids]
+    # Batching stays off for the site and endpoint, so the route is not tried again.
+    wp_api.batch_items(site.api_base, {}, "posts", actions[:1], backup=False)
+    assert len(calls) == 1
+    assert wp_api._batch_support[(site.api_base, "posts")] is False
+
+def test_other_batch_errors_fail_the_actions(site, monkeypatch):
+    _block_batch(site, 500, monkeypatch)
+    outcomes = wp_api.batch_items(site.api_base, {}, "posts",
+                                  [{"id": min(site.items["posts"]), "action": "update", "changes": {"title": "x"}}],
+                                  backup=False)
+    assert outcomes[0][0] is False
+    assert outcomes[0][1].startswith("HTTP 500")
@@ -1,39 +1,359 @@
 # utils/ai.py
-import openai
+import html
 import json
+import queue
+import re
+from concurrent.futures import ThreadPoolExecutor
+from utils.logger import log_error
+from utils import ai_cache, metrics
 
-def process_prompt_via_openai(prompt: str, items: list, content_type: str) -> dict:
+SYSTEM_PROMPT = (
+    "You are an expert WordPress content editor. "
+    "Receive a natural language command and details about content items. "
+    "Return a JSON object with a key 'actions' that is a list of actions. "
+    "Each action must have 'id' (post id or 'new'), 'action' (create, update, delete), "
+    "and 'changes' (a dictionary mapping field names to new values). Do not include extra text."
+)
+CHUNK_TOKEN_BUDGET = 3000   # estimated prompt tokens per chunk: the command and its context, then item summaries
+MAX_OUTPUT_TOKENS = 2000
+EXCERPT_CHARS = 300
+FIELD_CHARS = 200
+SUMMARY_FIELDS = ("status", "slug")
+PLANNER_WORKERS = 4
+VALID_ACTIONS = ("create", "update", "delete")
+
+class ReplyTruncated(Exception):
+    """The model stopped at the max_tokens limit, so its reply is incomplete."""
+
+class OpenAIChatModel:
     """
-    Uses OpenAI's GPT-4 to process a natural language prompt.
-    Returns a JSON object with key 'actions' listing actions.
-    Each action is a dict with 'id', 'action' (create, update, delete), and 'changes' (dict).
+    Chat model backed by OpenAI's ChatCompletion API.
+    Planners only call `complete(messages, max_tokens) -> str`, so any object with that
+    method (e.g. a local stub) can stand in for it. A model may raise ReplyTruncated when the
+    reply was cut off at `max_tokens`; planners then split the chunk and plan the halves.
     """
-    system_prompt = (
-        "You are an expert WordPress content editor. "
-        "Receive a natural language command and details about content items. "
-        "Return a JSON object with a key 'actions' that is a list of actions. "
-        "Each action must have 'id' (post id or 'new'), 'action' (create, update, delete), "
-        "and 'changes' (a dictionary mapping field names to new values). Do not include extra text."
-    )
+
+    def __init__(self, model: str = "gpt-4", temperature: float = 0.3):
+        self.model = model
+        self.temperature = temperature
+
+    def complete(self, messages: list, max_tokens: int) -> str:
+        import openai  # imported on the first request, not when a page loads
+        with metrics.span("openai_chat", model=self.model, mode="complete"):
+            response = openai.ChatCompletion.create(
+                model=self.model,
+                messages=messages,
+                temperature=self.temperature,
+                max_tokens=max_tokens
+            )
+        if response.choices[0].get("finish_reason") == "length":
+            raise ReplyTruncated(f"Reply cut off at {max_tokens} tokens.")
+        return response.choices[0].message['content']
+
+    def stream(self, messages: list, max_tokens: int):
+        """Yield the completion text fragment by fragment as it is generated."""
+        import openai
+        with metrics.span("openai_chat", model=self.model, mode="stream"):
+            response = openai.ChatCompletion.create(
+                model=self.model,
+                messages=messages,
+                temperature=self.temperature,
+                max_tokens=max_tokens,
+                stream=True
+            )
+            for chunk in response:
+                fragment = chunk.choices[0].delta.get("content")
+                if fragment:
+                    yield fragment
+                if chunk.choices[0].get("finish_reason") == "length":
+                    raise ReplyTruncated(f"Reply cut off at {max_tokens} tokens.")
+
+class ActionStreamParser:
+    """
+    Incrementally extracts the objects of the "actions" array from a streamed
+    {"actions": [...]} reply: feed() returns each action as soon as its closing brace arrives.
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.current = None
+
+    def feed(self, text: str) -> list:
+        actions = []
+        for ch in text:
+            if self.current is not None:
+                self.current.append(ch)
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+                continue
+            if ch == '"':
+                self.in_string = True
+            elif ch in "{[":
+                if ch == "{" and self.depth == 2:
+                    self.current = [ch]
+                self.depth += 1
+            elif ch in "}]":
+                self.depth -= 1
+                if ch == "}" and self.depth == 2 and self.current is not None:
+                    try:
+                        actions.append(json.loads("".join(self.current)))
+                    except ValueError:
+                        pass
+                    self.current = None
+        return actions
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about 4 characters per token) used for chunk budgeting."""
+    return len(text) // 4 + 1
+
+def _plain(value, limit: int) -> str:
+    if isinstance(value, dict):
+        value = value.get("raw", value.get("rendered", ""))
+    text = html.unescape(re.sub(r"<[^>]+>", " ", str(value or "")))
+    text = re.sub(r"\s+", " ", text).strip()
+    return text[:limit]
+
+def summarize_item(item: dict, fields=SUMMARY_FIELDS) -> dict:
+    """Compact view of an item for the prompt: id, title, excerpt and selected fields."""
+    summary = {"id": item.get("id"), "title": _plain(item.get("title", item.get("name")), FIELD_CHARS)}
+    for source in ("excerpt", "content", "description"):
+        excerpt = _plain(item.get(source), EXCERPT_CHARS)
+        if excerpt:
+            summary["excerpt"] = excerpt
+            break
+    for field in fields or ():
+        if field in item:
+            value = item[field]
+            summary[field] = value if isinstance(value, (int, float, bool)) or value is None else _plain(value, FIELD_CHARS)
+    return summary
+
+def item_budget(prompt: str, override: str = None, token_budget: int = CHUNK_TOKEN_BUDGET) -> int:
+    """
+    Tokens left for item summaries in each chunk once the command, its extra context and the
+    override (sent again with every chunk) are counted; at least a quarter of `token_budget`.
+    """
+    return max(token_budget // 4, token_budget - estimate_tokens(prompt + (override or "")))
+
+def chunk_items(summaries: list, token_budget: int = CHUNK_TOKEN_BUDGET) -> list:
+    """Split summaries into chunks whose estimated token size stays within `token_budget`."""
+    chunks, current, used = [], [], 0
+    for summary in summaries:
+        cost = estimate_tokens(json.dumps(summary))
+        if current and used + cost > token_budget:
+            chunks.append(current)
+            current, used = [], 0
+        current.append(summary)
+        used += cost
+    chunks.append(current)
+    return chunks
+
+def parse_plan(text: str) -> dict:
+    """Parse a model reply into a plan, tolerating text around the JSON object."""
+    try:
+        return json.loads(text)
+    except Exception:
+        start, end = text.find("{"), text.rfind("}")
+        if start != -1 and end > start:
+            try:
+                return json.loads(text[start:end + 1])
+            except Exception:
+                pass
+    raise ValueError("Model reply is not a JSON plan.")
+
+def validate_actions(actions, allowed_ids: set, allow_create: bool = True) -> list:
+    """Keep well-formed actions that target ids the model was shown (or create new items)."""
+    valid = []
+    for action in actions if isinstance(actions, list) else []:
+        if not isinstance(action, dict) or action.get("action") not in VALID_ACTIONS:
+            continue
+        changes = action.get("changes") or {}
+        if not isinstance(changes, dict):
+            continue
+        if action["action"] == "create":
+            if allow_create and changes:
+                valid.append({"id": "new", "action": "create", "changes": changes})
+        elif str(action.get("id")) in allowed_ids:
+            if action["action"] == "update" and not changes:
+                continue
+            valid.append({"id": action["id"], "action": action["action"], "changes": changes})
+    return valid
+
+def merge_actions(chunk_plans: list) -> list:
+    """Merge per-chunk action lists; repeated updates of one id are folded together."""
+    merged, by_id = [], {}
+    for actions in chunk_plans:
+        for action in actions or []:
+            key = str(action["id"])
+            if action["action"] == "create":
+                merged.append(action)
+            elif key in by_id:
+                existing = by_id[key]
+                if action["action"] == "delete" or existing["action"] == "delete":
+                    existing.update(action="delete", changes={})
+                else:
+                    existing["changes"].update(action["changes"])
+            else:
+                by_id[key] = action
+                merged.append(action)
+    return merged
+
+def _chunk_messages(prompt: str, content_type: str, chunk: list, index: int, total: int,
+                    override: str = None, creates: bool = None) -> list:
     user_message = (
         f"User command: {prompt}\n"
         f"Content type: {content_type}\n"
-        f"Number of items: {len(items)}.\n"
-        "For each item, generate the necessary changes as a JSON object."
+        f"Items (batch {index + 1} of {total}, {len(chunk)} items): {json.dumps(chunk)}\n"
+        "For each item that the command affects, generate the necessary changes as a JSON object. "
+        "Only reference ids from this batch."
     )
-    messages = [
-        {"role": "system", "content": system_prompt},
-        {"role": "user", "content": user_message}
-    ]
+    if not (index == 0 if creates is None else creates):
+        user_message += " Do not propose 'create' actions; they are handled in batch 1."
+    messages = [{"role": "system", "content": SYSTEM_PROMPT}]
+    if override:
+        messages.append({"role": "system", "content": override})
+    messages.append({"role": "user", "content": user_message})
+    return messages
+
+def _plan_chunk(model, prompt: str, content_type: str, chunk: list, index: int, total: int,
+                override: str = None, creates: bool = None) -> (list, bool):
+    """
+    Plan one chunk; returns (actions, ok). A reply cut off at MAX_OUTPUT_TOKENS is retried as
+    two half chunks (only the first may propose creates); ok is False when any part failed.
+    """
+    creates = index == 0 if creates is None else creates
+    messages = _chunk_messages(prompt, content_type, chunk, index, total, override, creates)
     try:
-        response = openai.ChatCompletion.create(
-            model="gpt-4",
-            messages=messages,
-            temperature=0.3,
-            max_tokens=800
-        )
-        ai_output = response.choices[0].message['content']
-        plan = json.loads(ai_output)
-        return plan
+        plan = parse_plan(model.complete(messages, MAX_OUTPUT_TOKENS))
+        return validate_actions(plan.get("actions", []), {str(s["id"]) for s in chunk}, allow_create=creates), True
+    except ReplyTruncated as e:
+        if len(chunk) > 1:
+            half = len(chunk) // 2
+            first, first_ok = _plan_chunk(model, prompt, content_type, chunk[:half], index, total, override, creates)
+            second, second_ok = _plan_chunk(model, prompt, content_type, chunk[half:], index, total, override, False)
+            return first + second, first_ok and second_ok
+        log_error(f"AI planning failed for batch {index + 1}/{total}: {e}")
     except Exception as e:
-        return {"actions": []}
+        log_error(f"AI planning failed for batch {index + 1}/{total}: {e}")
+    return [], False
+
+def _prepare(prompt: str, items: list, content_type: str, fields, override: str) -> (list, str):
+    summaries = [summarize_item(item, fields) for item in items]
+    return summaries, ai_cache.make_key(prompt, content_type, ai_cache.fingerprint(summaries), override)
+
+def plan_actions(prompt: str, items: list, content_type: str, fields=SUMMARY_FIELDS, model=None,
+                 token_budget: int = CHUNK_TOKEN_BUDGET, max_workers: int = PLANNER_WORKERS,
+                 override: str = None, use_cache: bool = True) -> dict:
+    """
+    Plan a command over any number of items.
+    Items are reduced to compact summaries, split into token-budgeted chunks and planned
+    concurrently (at most `max_workers` model calls in flight); the per-chunk action lists are
+    validated and merged into one plan {"actions": [...], "failed_chunks": [...]}. The budget
+    covers the prompt, which is repeated in every chunk (see item_budget). `failed_chunks` lists
+    the indices of chunks that could not be planned; their items have no actions in the plan.
+    `override` is the owner's extra system prompt. Complete plans are cached on disk, keyed by
+    the command, content type, summaries and override (see utils/ai_cache.py).
+    `model` is any object with `complete(messages, max_tokens) -> str` (default: OpenAIChatModel).
+    """
+    summaries, cache_key = _prepare(prompt, items, content_type, fields, override)
+    if use_cache:
+        cached = ai_cache.get(cache_key)
+        if cached is not None:
+            return cached
+    model = model or OpenAIChatModel()
+    chunks = chunk_items(summaries, item_budget(prompt, override, token_budget))
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        outcomes = list(pool.map(
+            lambda args: _plan_chunk(model, prompt, content_type, args[1], args[0], len(chunks), override),
+            enumerate(chunks)))
+    plan = {"actions": merge_actions([actions for actions, _ in outcomes]),
+            "failed_chunks": [index for index, (_, ok) in enumerate(outcomes) if not ok]}
+    if use_cache and not plan["failed_chunks"]:
+        ai_cache.put(cache_key, plan)
+    return plan
+
+def _stream_chunk(model, prompt: str, content_type: str, chunk: list, index: int, total: int,
+                  override: str, out: queue.Queue):
+    """
+    Stream one chunk, putting (action, index, None) on `out` for each validated action, then
+    (None, index, succeeded). When the reply
+    is cut off at MAX_OUTPUT_TOKENS, the items it did not act on are planned again in halves.
+    """
+    messages = _chunk_messages(prompt, content_type, chunk, index, total, override)
+    allowed_ids = {str(s["id"]) for s in chunk}
+    parser = ActionStreamParser()
+    acted, created = set(), False
+    try:
+        fragments = model.stream(messages, MAX_OUTPUT_TOKENS) if hasattr(model, "stream") \
+            else [model.complete(messages, MAX_OUTPUT_TOKENS)]
+        for fragment in fragments:
+            for action in validate_actions(parser.feed(fragment), allowed_ids, allow_create=index == 0):
+                acted.add(str(action["id"]))
+                created = created or action["action"] == "create"
+                out.put((action, index, None))
+        out.put((None, index, True))
+    except ReplyTruncated:
+        # Creates are only planned again when none were written; the model cannot tell which are missing.
+        rest = [s for s in chunk if str(s["id"]) not in acted]
+        parts = [rest[:len(rest) // 2], rest[len(rest) // 2:]] if len(rest) > 1 else [rest]
+        ok = True
+        for number, part in enumerate(part for part in parts if part):
+            actions, part_ok = _plan_chunk(model, prompt, content_type, part, index, total, override,
+                                           creates=number == 0 and index == 0 and not created)
+            ok = ok and part_ok
+            for action in actions:
+                out.put((action, index, None))
+        out.put((None, index, ok))
+    except Exception as e:
+        log_error(f"AI planning failed for batch {index + 1}/{total}: {e}")
+        out.put((None, index, False))
+
+def stream_plan_actions(prompt: str, items: list, content_type: str, fields=SUMMARY_FIELDS, model=None,
+                        token_budget: int = CHUNK_TOKEN_BUDGET, max_workers: int = PLANNER_WORKERS,
+                        override: str = None, use_cache: bool = True, failed_chunks: list = None):
+    """
+    Streaming variant of plan_actions: yields each validated action as soon as the model has
+    finished writing it, across all concurrently planned chunks.
+    `model.stream(messages, max_tokens)` is used when available, otherwise `model.complete`.
+    The indices of chunks that could not be planned are appended to `failed_chunks`, if given.
+    A complete plan is cached once every chunk has finished successfully.
+    """
+    summaries, cache_key = _prepare(prompt, items, content_type, fields, override)
+    if use_cache:
+        cached = ai_cache.get(cache_key)
+        if cached is not None:
+            yield from cached.get("actions", [])
+            return
+    model = model or OpenAIChatModel()
+    chunks = chunk_items(summaries, item_budget(prompt, override, token_budget))
+    out = queue.Queue()
+    collected, finished, succeeded = [], 0, True
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for index, chunk in enumerate(chunks):
+            pool.submit(_stream_chunk, model, prompt, content_type, chunk, index, len(chunks), override, out)
+        while finished < len(chunks):
+            action, index, ok = out.get()
+            if action is None:
+                finished += 1
+                succeeded = succeeded and ok
+                if not ok and failed_chunks is not None:
+                    failed_chunks.append(index)
+                continue
+            collected.append(action)
+            yield action
+    if use_cache and succeeded:
+        ai_cache.put(cache_key, {"actions": merge_actions([collected])})
+
+def process_prompt_via_openai(prompt: str, items: list, content_type: str, override: str = None) -> dict:
+    """
+    Uses OpenAI's GPT-4 to process a natural language prompt.
+    Returns a JSON object with key 'actions' listing actions.
+    Each action is a dict with 'id', 'action' (create, update, delete), and 'changes' (dict).
+    """
+    return plan_actions(prompt, items, content_type, override=override)
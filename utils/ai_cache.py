@@ -0,0 +1,110 @@
+# utils/ai_cache.py
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from utils import metrics
+
+CACHE_FILE = "ai_plan_cache.db"
+TTL_SECONDS = 24 * 3600
+MAX_BYTES = 50 * 1024 * 1024
+
+_local = threading.local()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS plans (
+    key TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    size INTEGER NOT NULL,
+    value BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_plans_accessed ON plans (accessed_at);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+def _conn() -> sqlite3.Connection:
+    conn = getattr(_local, "conn", None)
+    if conn is None or getattr(_local, "path", None) != CACHE_FILE:
+        conn = sqlite3.connect(CACHE_FILE, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+        _local.conn, _local.path = conn, CACHE_FILE
+    return conn
+
+def normalize_command(command: str) -> str:
+    """Collapse whitespace only; case is kept because it reaches the plan (titles, content)."""
+    return re.sub(r"\s+", " ", command or "").strip()
+
+def fingerprint(data) -> str:
+    """Stable SHA-256 of any JSON-serialisable value."""
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+def make_key(command: str, content_type: str, items_fingerprint: str, override: str = None) -> str:
+    """Cache key for a plan: normalized command, content type, item fingerprint and owner override."""
+    return fingerprint([normalize_command(command), content_type, items_fingerprint, (override or "").strip()])
+
+def _count(conn: sqlite3.Connection, name: str):
+    conn.execute("INSERT INTO counters (name, value) VALUES (?, 1) "
+                 "ON CONFLICT(name) DO UPDATE SET value = value + 1", (name,))
+
+def get(key: str, ttl: float = TTL_SECONDS):
+    """Return the cached plan for `key`, or None; counts a hit or a miss."""
+    conn = _conn()
+    now = time.time()
+    with conn:
+        row = conn.execute("SELECT created_at, value FROM plans WHERE key = ?", (key,)).fetchone()
+        if row and now - row[0] <= ttl:
+            conn.execute("UPDATE plans SET accessed_at = ? WHERE key = ?", (now, key))
+            _count(conn, "hits")
+            metrics.incr("cache_lookups", cache="ai_plan", result="hit")
+            return json.loads(zlib.decompress(row[1]).decode())
+        if row:
+            conn.execute("DELETE FROM plans WHERE key = ?", (key,))
+        _count(conn, "misses")
+    metrics.incr("cache_lookups", cache="ai_plan", result="miss")
+    return None
+
+def put(key: str, plan: dict, ttl: float = TTL_SECONDS, max_bytes: int = MAX_BYTES):
+    """Store a plan, then evict expired entries and least recently used ones beyond `max_bytes`."""
+    value = zlib.compress(json.dumps(plan).encode())
+    conn = _conn()
+    now = time.time()
+    with conn:
+        conn.execute("INSERT OR REPLACE INTO plans (key, created_at, accessed_at, size, value) VALUES (?, ?, ?, ?, ?)",
+                     (key, now, now, len(value), value))
+        conn.execute("DELETE FROM plans WHERE created_at < ?", (now - ttl,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM plans").fetchone()[0]
+        if total > max_bytes:
+            for old_key, size in conn.execute("SELECT key, size FROM plans ORDER BY accessed_at").fetchall():
+                if total <= max_bytes:
+                    break
+                conn.execute("DELETE FROM plans WHERE key = ?", (old_key,))
+                total -= size
+
+def stats() -> dict:
+    """Hit/miss counters and current size of the cache."""
+    conn = _conn()
+    counters = dict(conn.execute("SELECT name, value FROM counters").fetchall())
+    entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM plans").fetchone()
+    lookups = counters.get("hits", 0) + counters.get("misses", 0)
+    return {
+        "hits": counters.get("hits", 0),
+        "misses": counters.get("misses", 0),
+        "hit_rate": round(counters.get("hits", 0) / lookups, 3) if lookups else 0.0,
+        "entries": entries,
+        "bytes": size,
+    }
+
+def clear():
+    """Drop every cached plan and reset the counters."""
+    conn = _conn()
+    with conn:
+        conn.execute("DELETE FROM plans")
+        conn.execute("DELETE FROM counters")
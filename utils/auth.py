@@ -1,9 +1,9 @@
 # utils/auth.py
 import json, os
 import streamlit as st
-from cryptography.fernet import Fernet
 
 def get_fernet():
+    from cryptography.fernet import Fernet
     key = st.secrets.get("credentials", {}).get("ENCRYPT_KEY")
     if key:
         return Fernet(key.encode())
@@ -43,9 +43,9 @@ def get_basic_auth_headers(username: str, app_password: str) -> dict:
     return {"Authorization": f"Basic {token}"}
 
 def test_wp_connection(api_base: str, headers: dict) -> bool:
-    import requests
+    from utils.http_session import get_session
     try:
-        resp = requests.get(api_base + "/posts?per_page=1", headers=headers)
+        resp = get_session(api_base).get(api_base + "/posts?per_page=1", headers=headers)
         return resp.status_code < 400
     except Exception as e:
         return False
@@ -0,0 +1,70 @@
+# utils/diff.py
+import json
+
+def _plain(value):
+    """Comparable form of a field value: {"raw", "rendered"} objects collapse to raw (or rendered)."""
+    if isinstance(value, dict) and ("raw" in value or "rendered" in value):
+        value = value.get("raw", value.get("rendered"))
+    if isinstance(value, str):
+        return value.replace("\r\n", "\n").strip()
+    return value
+
+def _same(current, new) -> bool:
+    if isinstance(current, dict) and "rendered" in current and "raw" not in current:
+        return False  # only the rendered HTML is known (view context); the stored raw value may differ
+    current, new = _plain(current), _plain(new)
+    if current == new:
+        return True
+    if isinstance(current, list) and isinstance(new, list):
+        # Term ids and similar lists: order does not matter and "3" equals 3.
+        return sorted(map(str, current)) == sorted(map(str, new))
+    if isinstance(current, (int, float, str)) and isinstance(new, (int, float, str)) \
+            and not isinstance(current, bool) and not isinstance(new, bool):
+        return str(current) == str(new)
+    return False
+
+def changed_fields(current: dict, changes: dict) -> dict:
+    """
+    The subset of `changes` that differs from the item's `current` state.
+    Nested `meta` (and other plain object) fields are compared key by key, so only changed keys
+    are kept. Fields missing from `current`, and {"raw", "rendered"} fields without "raw" (items
+    fetched in view context), count as changed.
+    """
+    minimal = {}
+    for field, value in changes.items():
+        if field not in current:
+            minimal[field] = value
+        elif isinstance(value, dict) and isinstance(current[field], dict) \
+                and not ("raw" in value or "rendered" in value) \
+                and not ("raw" in current[field] or "rendered" in current[field]):
+            nested = {key: sub for key, sub in value.items()
+                      if key not in current[field] or not _same(current[field][key], sub)}
+            if nested:
+                minimal[field] = nested
+        elif not _same(current[field], value):
+            minimal[field] = value
+    return minimal
+
+def _size(changes: dict) -> int:
+    return len(json.dumps(changes, default=str).encode())
+
+def minimize_actions(actions: list, snapshots: dict) -> (list, list, int):
+    """
+    Drop no-op fields from update actions, comparing them with the snapshot of each item
+    ({item_id: data}); updates left with no changes are skipped entirely. Other actions and
+    updates of items without a snapshot pass through unchanged.
+    Returns (actions to send, skipped no-op updates, request body bytes saved).
+    """
+    kept, skipped, saved = [], [], 0
+    for action in actions:
+        current = snapshots.get(str(action.get("id"))) if action.get("action") == "update" else None
+        if current is None or not isinstance(action.get("changes"), dict):
+            kept.append(action)
+            continue
+        minimal = changed_fields(current, action["changes"])
+        saved += _size(action["changes"]) - (_size(minimal) if minimal else 0)
+        if minimal:
+            kept.append(dict(action, changes=minimal))
+        else:
+            skipped.append(action)
+    return kept, skipped, saved
@@ -0,0 +1,269 @@
+# utils/executor.py
+import re
+import threading
+from array import array
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlsplit
+from utils import journal, metrics
+from utils.diff import minimize_actions
+from utils.logger import log_error
+from utils.wp_api import (create_item, update_item, delete_item, batch_items, supports_batch,
+                          snapshot_items, BATCH_LIMIT)
+
+DEFAULT_CONCURRENCY = 4
+DEFAULT_RATE = 5.0  # requests per second, adapted at runtime
+THROTTLE_STATUSES = (429, 503)
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+class TokenBucket:
+    """
+    Token-bucket rate limiter whose refill rate adapts to the server:
+    halved when a request is throttled, raised slowly after each success.
+    """
+
+    def __init__(self, rate: float = DEFAULT_RATE, capacity: float = None,
+                 min_rate: float = 0.5, max_rate: float = 50.0):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        """Block until a token is available, then take it."""
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def throttled(self):
+        with self.lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = 0
+
+    def succeeded(self):
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + 0.1)
+
+def get_rate_limiter(api_base: str, rate: float = DEFAULT_RATE) -> TokenBucket:
+    """Return the shared rate limiter for the site of `api_base`."""
+    parts = urlsplit(api_base)
+    key = f"{parts.scheme}://{parts.netloc}".lower()
+    with _limiters_lock:
+        if key not in _limiters:
+            _limiters[key] = TokenBucket(rate=rate)
+        return _limiters[key]
+
+def _http_status(msg: str):
+    match = re.match(r"HTTP (\d{3})", msg or "")
+    return int(match.group(1)) if match else None
+
+def run_action(api_base: str, headers: dict, endpoint: str, action: dict, op_id: str = None,
+               backup: bool = True) -> (bool, str):
+    """Dispatch a single plan action to the matching wp_api call."""
+    kind = action.get("action")
+    if kind == "create":
+        return create_item(api_base, headers, endpoint, action, op_id)
+    elif kind == "update":
+        return update_item(api_base, headers, endpoint, action, op_id, backup)
+    elif kind == "delete":
+        return delete_item(api_base, headers, endpoint, action, op_id, backup)
+    return False, "Unknown action"
+
+def _result(action: dict, success: bool, msg: str, latency: float) -> dict:
+    result = {
+        "ID": action.get("id"),
+        "Action": action.get("action"),
+        "Result": msg,
+        "Success": success,
+        "Latency (s)": round(latency, 3),
+    }
+    if "_seq" in action:  # caller's position of the action (utils.jobs), so results can be matched back
+        result["_seq"] = action["_seq"]
+    return result
+
+def _timed_action(limiter: TokenBucket, api_base, headers, endpoint, action, op_id):
+    limiter.acquire()
+    started = time.monotonic()
+    success, msg = run_action(api_base, headers, endpoint, action, op_id, backup=False)
+    latency = time.monotonic() - started
+    metrics.observe("wp_action", latency, endpoint=endpoint, action=action.get("action"), ok=success)
+    if _http_status(msg) in THROTTLE_STATUSES:
+        limiter.throttled()
+    elif success:
+        limiter.succeeded()
+    return _result(action, success, msg, latency)
+
+def _timed_batch(limiter: TokenBucket, api_base, headers, endpoint, actions, op_id):
+    limiter.acquire()
+    started = time.monotonic()
+    outcomes = batch_items(api_base, headers, endpoint, actions, op_id, backup=False)
+    latency = time.monotonic() - started
+    metrics.observe("wp_batch", latency, endpoint=endpoint, size=len(actions))
+    statuses = [_http_status(msg) for _, msg in outcomes]
+    if any(status in THROTTLE_STATUSES for status in statuses):
+        limiter.throttled()
+    elif any(success for success, _ in outcomes):
+        limiter.succeeded()
+    return [_result(action, success, msg, latency) for action, (success, msg) in zip(actions, outcomes)]
+
+def _chunks(actions: list, size: int):
+    for start in range(0, len(actions), size):
+        yield actions[start:start + size]
+
+def _groups(actions, size: int):
+    """Group any iterable of actions into lists of `size`, without reading ahead further."""
+    group = []
+    for action in actions:
+        group.append(action)
+        if len(group) >= size:
+            yield group
+            group = []
+    if group:
+        yield group
+
+def _percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+class RunStats:
+    """Running outcome/latency tally, so a summary does not require keeping every result."""
+
+    def __init__(self):
+        self.latencies = array("d")
+        self.by_action = {}
+
+    def add(self, result: dict):
+        self.latencies.append(result["Latency (s)"])
+        counts = self.by_action.setdefault(result["Action"] or "unknown", {"succeeded": 0, "failed": 0})
+        counts["succeeded" if result["Success"] else "failed"] += 1
+
+    def summary(self, elapsed: float) -> dict:
+        latencies = list(self.latencies)
+        succeeded = sum(c["succeeded"] for c in self.by_action.values())
+        return {
+            "total": len(latencies),
+            "succeeded": succeeded,
+            "failed": len(latencies) - succeeded,
+            "by_action": self.by_action,
+            "elapsed_s": round(elapsed, 3),
+            "actions_per_s": round(len(latencies) / elapsed, 2) if elapsed > 0 else 0.0,
+            "latency_p50_s": _percentile(latencies, 50),
+            "latency_p95_s": _percentile(latencies, 95),
+            "latency_max_s": max(latencies) if latencies else 0.0,
+        }
+
+def summarize_results(results: list, elapsed: float) -> dict:
+    """Build a latency/outcome summary for a finished run."""
+    stats = RunStats()
+    for result in results:
+        stats.add(result)
+    return stats.summary(elapsed)
+
+def execute_plan(api_base: str, headers: dict, endpoint: str, actions,
+                 max_workers: int = DEFAULT_CONCURRENCY, op_id: str = None,
+                 on_result=None, use_batch: bool = False, known_items: list = None,
+                 group_size: int = None, keep_results: bool = True, minimize: bool = True) -> (list, dict):
+    """
+    Apply plan actions concurrently, at most `max_workers` in flight for the site and
+    paced by the site's adaptive rate limiter.
+    `actions` may be a list or any iterable, such as ai.stream_plan_actions(): it is consumed in
+    groups of `group_size` (default: the whole list, or BATCH_LIMIT for other iterables) and each
+    group is dispatched as soon as it is complete, while later actions are still being produced.
+    The whole run is journaled as one rollback operation (`op_id`, created when not given).
+    Before a group is dispatched, every item it updates or deletes is snapshotted for rollback
+    in one bulk stage (see snapshot_items), reusing `known_items` fetched earlier in the run.
+    With `use_batch`, actions are grouped into /wp-json/batch/v1 calls of up to BATCH_LIMIT
+    sub-requests; sites or endpoints without batch support fall back to per-item calls.
+    `on_result(result, done, total)` is called from the calling thread after each action (total
+    counts the actions received so far), so it is safe to update Streamlit elements from it. An
+    action's private `_seq` key, if any, is copied into its result.
+    With `minimize`, updates are then diffed against those snapshots (see utils/diff.py): fields
+    that already hold the planned value are dropped and updates with nothing left are skipped
+    (reported as successful, unchanged) without a request.
+    Returns (results, summary); the summary carries the operation id, the number of unchanged
+    items and the request bytes saved. With `keep_results=False` results are only passed to
+    `on_result` and not retained, keeping memory flat for huge imports.
+    """
+    if group_size is None:
+        group_size = max(1, len(actions)) if isinstance(actions, list) else BATCH_LIMIT
+    op_id = op_id or journal.begin_operation(api_base, endpoint, label=endpoint)
+    limiter = get_rate_limiter(api_base)
+    results = []
+    stats = RunStats()
+    received = 0
+    unchanged_count = bytes_saved = 0
+    started = time.monotonic()
+    batched = use_batch and supports_batch(api_base, headers, endpoint)
+
+    def record(result):
+        stats.add(result)
+        if not result["Success"]:
+            log_error(result["Result"], site=journal.site_of(api_base), endpoint=endpoint,
+                      action_id=result["ID"], latency=result["Latency (s)"],
+                      status=_http_status(result["Result"]))
+        if keep_results:
+            results.append(result)
+        if on_result:
+            on_result(result, len(stats.latencies), received)
+
+    def report(future):
+        outcome = future.result()
+        for result in outcome if isinstance(outcome, list) else [outcome]:
+            record(result)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        pending = set()
+        for group in _groups(actions, group_size):
+            received += len(group)
+            targets = [a["id"] for a in group if a.get("action") in ("update", "delete") and "id" in a]
+            snapshots = {}
+            if targets:
+                snapshots = snapshot_items(api_base, headers, endpoint, targets, known_items=known_items,
+                                           op_id=op_id, max_workers=max_workers)
+            if minimize and snapshots:
+                group, unchanged, saved = minimize_actions(group, snapshots)
+                unchanged_count += len(unchanged)
+                bytes_saved += saved
+                for action in unchanged:
+                    record(_result(action, True, f"ID {action.get('id')} unchanged; skipped.", 0.0))
+            if batched:
+                known, unknown = [], []
+                for action in group:
+                    (known if action.get("action") in ("create", "update", "delete") else unknown).append(action)
+                pending.update(pool.submit(_timed_batch, limiter, api_base, headers, endpoint, chunk, op_id)
+                               for chunk in _chunks(known, BATCH_LIMIT))
+            else:
+                unknown = group
+            pending.update(pool.submit(_timed_action, limiter, api_base, headers, endpoint, action, op_id)
+                           for action in unknown)
+            for future in [f for f in pending if f.done()]:
+                pending.discard(future)
+                report(future)
+        for future in as_completed(pending):
+            report(future)
+    summary = stats.summary(time.monotonic() - started)
+    summary["operation_id"] = op_id
+    summary["unchanged"] = unchanged_count
+    summary["bytes_saved"] = bytes_saved
+    if bytes_saved:
+        metrics.incr("diff_bytes_saved", bytes_saved, endpoint=endpoint)
+        metrics.incr("diff_skipped_actions", unchanged_count, endpoint=endpoint)
+    return results, summary
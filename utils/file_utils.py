@@ -1,20 +1,42 @@
 # utils/file_utils.py
-import pandas as pd
-import io
-import chardet  # install via pip install chardet
-import fitz    # PyMuPDF; install via pip install PyMuPDF
-import docx    # python-docx; install via pip install python-docx
-from PIL import Image, ExifTags
+import codecs
+import os
+from typing import TYPE_CHECKING
+from utils import metrics
+
+# pandas, PyMuPDF (fitz), python-docx and Pillow are imported inside the parsers that need them,
+# so importing this module (and every page that uses it) stays cheap.
+if TYPE_CHECKING:
+    import pandas as pd
+
+BOM_ENCODINGS = (
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
 
 def detect_encoding(file_obj, num_bytes=10000):
+    """Detect a file's encoding: BOM first, then a UTF-8 check, and chardet only as a last resort."""
     rawdata = file_obj.read(num_bytes)
     file_obj.seek(0)
-    import chardet
+    for bom, encoding in BOM_ENCODINGS:
+        if rawdata.startswith(bom):
+            return encoding
+    try:
+        # A partial sample may end mid-character; only a complete file must decode to the last byte.
+        codecs.getincrementaldecoder("utf-8")().decode(rawdata, final=len(rawdata) < num_bytes)
+        return "utf-8"
+    except UnicodeDecodeError:
+        pass
+    import chardet  # install via pip install chardet
     result = chardet.detect(rawdata)
     return result["encoding"]
 
-def parse_csv(file_obj, delimiter=",", chunksize=None) -> pd.DataFrame:
+def parse_csv(file_obj, delimiter=",", chunksize=None) -> "pd.DataFrame":
     try:
+        import pandas as pd
         encoding = detect_encoding(file_obj)
         if chunksize:
             return pd.read_csv(file_obj, delimiter=delimiter, chunksize=chunksize, encoding=encoding)
@@ -23,8 +45,9 @@ def parse_csv(file_obj, delimiter=",", chunksize=None) -> pd.DataFrame:
     except Exception as e:
         return None
 
-def parse_excel(file_obj, sheet_name=0) -> pd.DataFrame:
+def parse_excel(file_obj, sheet_name=0) -> "pd.DataFrame":
     try:
+        import pandas as pd
         return pd.read_excel(file_obj, sheet_name=sheet_name)
     except Exception as e:
         return None
@@ -38,22 +61,119 @@ def parse_text(file_obj, encoding="utf-8") -> str:
     except Exception as e:
         return ""
 
-def parse_pdf(file_obj) -> str:
+MAX_DOC_PAGES = 300
+MAX_DOC_CHARS = 100000
+PDF_PARALLEL_PAGES = 50  # PDFs with more pages than this are extracted in a process pool
+PDF_PARALLEL_CHARS = 20000  # ...unless a smaller character budget is filled by the first few pages
+PDF_RANGE_PAGES = 25     # pages per worker task
+PDF_RANGE_TIMEOUT = 120  # seconds to wait for one page range
+
+def _within_budget(pieces, max_chars=None):
+    """Pass text pieces through until `max_chars` is reached, truncating the last one."""
+    remaining = max_chars
+    for piece in pieces:
+        if remaining is not None:
+            if remaining <= 0:
+                return
+            piece = piece[:remaining]
+            remaining -= len(piece)
+        yield piece
+
+def _pdf_pages_text(path: str, start: int, stop: int) -> list:
+    """Text of pages [start, stop) of a PDF file; runs in a worker process for large documents."""
+    import fitz  # PyMuPDF; install via pip install PyMuPDF
+    doc = fitz.open(path)
     try:
-        file_bytes = file_obj.read()
+        return [doc[i].get_text() for i in range(start, stop)]
+    finally:
+        doc.close()
+
+def _iter_pdf_text(file_bytes: bytes, page_count: int, workers: int = None):
+    workers = workers or min(os.cpu_count() or 1, 8)
+    if page_count <= PDF_PARALLEL_PAGES or workers == 1:
+        import fitz
         doc = fitz.open(stream=file_bytes, filetype="pdf")
-        text = ""
-        for page in doc:
-            text += page.get_text()
-        return text
+        try:
+            for i in range(page_count):
+                yield doc[i].get_text()
+        finally:
+            doc.close()
+        return
+    import itertools
+    import multiprocessing
+    import tempfile
+    from collections import deque
+    from concurrent.futures import ProcessPoolExecutor
+    # Workers open one temporary copy of the file instead of each receiving the bytes.
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
+        tmp.write(file_bytes)
+    ranges = iter(range(0, page_count, PDF_RANGE_PAGES))
+    # Spawned, not forked: a fork of the threaded app can inherit a held lock and hang.
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    futures = deque()
+    try:
+        def submit(start):
+            return pool.submit(_pdf_pages_text, tmp.name, start, min(start + PDF_RANGE_PAGES, page_count))
+
+        # At most one range per worker is in flight, so a caller that stops early (the
+        # character budget is met) does not pay for extracting the rest of the document.
+        futures.extend(submit(start) for start in itertools.islice(ranges, workers))
+        while futures:
+            pages = futures.popleft().result(timeout=PDF_RANGE_TIMEOUT)
+            for start in itertools.islice(ranges, 1):
+                futures.append(submit(start))
+            yield from pages
+    finally:
+        for future in futures:  # shutdown(cancel_futures=True) needs Python 3.9
+            future.cancel()
+        pool.shutdown(wait=False)
+        try:
+            os.remove(tmp.name)
+        except OSError:
+            pass  # still open in a worker on Windows
+
+def iter_pdf_pages(file_obj, max_pages: int = MAX_DOC_PAGES, max_chars: int = MAX_DOC_CHARS, workers: int = None):
+    """
+    Yield the text of a PDF page by page, stopping at `max_pages` pages or `max_chars` characters.
+    Large documents are split into page ranges extracted in parallel by a process pool;
+    pages are still yielded in order. A `max_chars` below PDF_PARALLEL_CHARS is read sequentially.
+    """
+    import fitz
+    file_bytes = file_obj.read()
+    doc = fitz.open(stream=file_bytes, filetype="pdf")
+    page_count = doc.page_count if max_pages is None else min(doc.page_count, max_pages)
+    doc.close()
+    if max_chars is not None and max_chars < PDF_PARALLEL_CHARS:
+        workers = 1
+    yield from _within_budget(_iter_pdf_text(file_bytes, page_count, workers), max_chars)
+
+def parse_pdf(file_obj, max_pages: int = MAX_DOC_PAGES, max_chars: int = MAX_DOC_CHARS) -> str:
+    try:
+        return "".join(iter_pdf_pages(file_obj, max_pages, max_chars))
     except Exception as e:
         return ""
 
-def parse_docx(file_obj) -> str:
+def iter_docx_sections(file_obj):
+    """Yield the text of a DOCX in reading order: section headers, then paragraphs and tables."""
+    import docx  # python-docx; install via pip install python-docx
+    from docx.table import Table
+    from docx.text.paragraph import Paragraph
+    document = docx.Document(file_obj)
+    for section in document.sections:
+        if not section.header.is_linked_to_previous:
+            header = "\n".join(p.text for p in section.header.paragraphs if p.text.strip())
+            if header:
+                yield header
+    for child in document.element.body.iterchildren():
+        if child.tag.endswith("}p"):
+            yield Paragraph(child, document).text
+        elif child.tag.endswith("}tbl"):
+            for row in Table(child, document).rows:
+                yield " | ".join(cell.text.strip() for cell in row.cells)
+
+def parse_docx(file_obj, max_chars: int = MAX_DOC_CHARS) -> str:
     try:
-        document = docx.Document(file_obj)
-        full_text = [para.text for para in document.paragraphs]
-        return "\n".join(full_text)
+        return "\n".join(_within_budget(iter_docx_sections(file_obj), max_chars))
     except Exception as e:
         return ""
 
@@ -79,6 +199,7 @@ def parse_css(file_obj, encoding="utf-8") -> str:
 
 def parse_image(file_obj) -> dict:
     try:
+        from PIL import Image, ExifTags
         img = Image.open(file_obj)
         info = {
             "format": img.format,
@@ -101,28 +222,122 @@ def parse_image(file_obj) -> dict:
     except Exception as e:
         return {}
 
-def parse_uploaded_file(file_obj, file_extension: str) -> dict:
+def iter_csv_batches(file_obj, batch_size: int = 1000, usecols=None, dtype=None, delimiter=","):
+    """Yield the rows of a CSV as lists of dicts, `batch_size` rows at a time."""
+    import pandas as pd
+    encoding = detect_encoding(file_obj)
+    reader = pd.read_csv(file_obj, delimiter=delimiter, encoding=encoding, chunksize=batch_size,
+                         usecols=usecols, dtype=dtype)
+    for chunk in reader:
+        yield chunk.to_dict(orient="records")
+
+def iter_excel_batches(file_obj, batch_size: int = 1000, usecols=None, sheet_name=None):
+    """
+    Yield the rows of an XLSX sheet as lists of dicts, `batch_size` rows at a time.
+    Uses openpyxl's read-only mode, so rows are streamed instead of loading the whole workbook.
+    """
+    from openpyxl import load_workbook
+    workbook = load_workbook(file_obj, read_only=True, data_only=True)
+    try:
+        sheet = workbook[sheet_name] if sheet_name else workbook.worksheets[0]
+        rows = sheet.iter_rows(values_only=True)
+        header = [str(h) if h is not None else f"column_{i}" for i, h in enumerate(next(rows, ()))]
+        keep = [i for i, h in enumerate(header) if usecols is None or h in usecols]
+        batch = []
+        for row in rows:
+            batch.append({header[i]: row[i] if i < len(row) else None for i in keep})
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+    finally:
+        workbook.close()
+
+def iter_uploaded_batches(file_obj, file_extension: str, batch_size: int = 1000, usecols=None, dtype=None):
+    """Stream a CSV or XLSX upload as row batches; `usecols` projects columns, `dtype` sets CSV types."""
+    if file_extension.lower() == "csv":
+        return iter_csv_batches(file_obj, batch_size, usecols=usecols, dtype=dtype)
+    elif file_extension.lower() == "xlsx":
+        return iter_excel_batches(file_obj, batch_size, usecols=usecols)
+    raise ValueError(f"Streaming is not supported for .{file_extension} files.")
+
+def read_header(file_obj, file_extension: str) -> list:
+    """Column names of a CSV or XLSX upload, read without loading its rows; the file is rewound."""
+    try:
+        if file_extension.lower() == "csv":
+            import pandas as pd
+            encoding = detect_encoding(file_obj)
+            return [str(c) for c in pd.read_csv(file_obj, encoding=encoding, nrows=0).columns]
+        elif file_extension.lower() == "xlsx":
+            from openpyxl import load_workbook
+            workbook = load_workbook(file_obj, read_only=True, data_only=True)
+            try:
+                first = next(workbook.worksheets[0].iter_rows(values_only=True), ())
+                return [str(h) if h is not None else f"column_{i}" for i, h in enumerate(first)]
+            finally:
+                workbook.close()
+        raise ValueError(f"Streaming is not supported for .{file_extension} files.")
+    finally:
+        file_obj.seek(0)
+
+def _cell_value(value):
+    if hasattr(value, "item"):  # numpy scalar -> plain Python value for JSON
+        value = value.item()
+    if isinstance(value, float) and value != value:  # NaN
+        return None
+    return value
+
+def iter_row_actions(batches, column_map: dict, id_column: str = None):
+    """
+    Turn row batches into batches of WordPress actions. `column_map` maps file columns to
+    WordPress fields; rows with a value in `id_column` become updates, the rest creates.
+    """
+    for batch in batches:
+        actions = []
+        for row in batch:
+            changes = {}
+            for column, field in column_map.items():
+                value = _cell_value(row.get(column))
+                if value is not None:
+                    changes[field] = value
+            if not changes:
+                continue
+            item_id = _cell_value(row.get(id_column)) if id_column else None
+            if item_id is not None:
+                try:
+                    item_id = int(item_id)
+                except (TypeError, ValueError):
+                    pass
+                actions.append({"id": item_id, "action": "update", "changes": changes})
+            else:
+                actions.append({"id": "new", "action": "create", "changes": changes})
+        yield actions
+
+def parse_uploaded_file(file_obj, file_extension: str, max_chars: int = MAX_DOC_CHARS) -> dict:
+    """Parse an upload by extension; PDF and DOCX text stops at `max_chars` characters."""
     result = {"content": None, "metadata": None}
-    if file_extension.lower() in ["csv"]:
-        df = parse_csv(file_obj)
-        if df is not None:
-            result["content"] = df.to_dict(orient="records")
-    elif file_extension.lower() in ["xlsx"]:
-        df = parse_excel(file_obj)
-        if df is not None:
-            result["content"] = df.to_dict(orient="records")
-    elif file_extension.lower() in ["txt"]:
-        result["content"] = parse_text(file_obj)
-    elif file_extension.lower() in ["pdf"]:
-        result["content"] = parse_pdf(file_obj)
-    elif file_extension.lower() in ["docx"]:
-        result["content"] = parse_docx(file_obj)
-    elif file_extension.lower() in ["html"]:
-        result["content"] = parse_html(file_obj)
-    elif file_extension.lower() in ["css"]:
-        result["content"] = parse_css(file_obj)
-    elif file_extension.lower() in ["jpg", "jpeg", "png"]:
-        result["metadata"] = parse_image(file_obj)
-    else:
-        result["content"] = None
+    with metrics.span("parse_file", ext=file_extension.lower()):
+        if file_extension.lower() in ["csv"]:
+            df = parse_csv(file_obj)
+            if df is not None:
+                result["content"] = df.to_dict(orient="records")
+        elif file_extension.lower() in ["xlsx"]:
+            df = parse_excel(file_obj)
+            if df is not None:
+                result["content"] = df.to_dict(orient="records")
+        elif file_extension.lower() in ["txt"]:
+            result["content"] = parse_text(file_obj)
+        elif file_extension.lower() in ["pdf"]:
+            result["content"] = parse_pdf(file_obj, max_chars=max_chars)
+        elif file_extension.lower() in ["docx"]:
+            result["content"] = parse_docx(file_obj, max_chars=max_chars)
+        elif file_extension.lower() in ["html"]:
+            result["content"] = parse_html(file_obj)
+        elif file_extension.lower() in ["css"]:
+            result["content"] = parse_css(file_obj)
+        elif file_extension.lower() in ["jpg", "jpeg", "png"]:
+            result["metadata"] = parse_image(file_obj)
+        else:
+            result["content"] = None
     return result
@@ -0,0 +1,101 @@
+# utils/http_session.py
+import re
+import threading
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from utils import metrics
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_TIMEOUT = (5, 30)  # (connect, read) seconds
+MAX_RETRIES = 3
+BACKOFF_FACTOR = 0.5
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_sessions = {}
+_lock = threading.Lock()
+
+class _WPRetry(Retry):
+    """
+    Retry on 429/5xx and read errors with backoff. POST is left out of the allowed methods, so a
+    POST that timed out or failed after being sent is never repeated (creates are not duplicated);
+    it is only retried on 429, which means the server refused it without acting on it.
+    """
+
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if method and method.upper() == "POST":
+            return status_code == 429
+        return super().is_retry(method, status_code, has_retry_after)
+
+class TimeoutSession(requests.Session):
+    """A requests.Session that applies a default timeout to every request."""
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT):
+        super().__init__()
+        self.timeout = timeout
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        parts = urlsplit(url)
+        route = re.sub(r"/\d+(?=/|$)", "/{id}", parts.path) or "/"
+        with metrics.span("http_request", host=parts.netloc, method=method.upper(), route=route) as labels:
+            try:
+                response = super().request(method, url, **kwargs)
+            except Exception:
+                labels["status"] = "error"
+                raise
+            labels["status"] = response.status_code
+        _record_transfer(parts.netloc, response, kwargs.get("stream"))
+        return response
+
+def _record_transfer(host: str, response, streamed: bool):
+    body = response.request.body
+    if isinstance(body, (bytes, str)):
+        metrics.incr("http_bytes_sent", len(body), host=host)
+    if not streamed:
+        metrics.incr("http_bytes_received", len(response.content), host=host)
+    retries = getattr(response.raw, "retries", None)
+    if retries is not None and retries.history:
+        metrics.incr("http_retries", len(retries.history), host=host)
+
+def _site_key(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}".lower()
+
+def build_session(pool_size: int = DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT,
+                  max_retries: int = MAX_RETRIES, backoff_factor: float = BACKOFF_FACTOR) -> TimeoutSession:
+    """Create a keep-alive session with a connection pool, retries and a default timeout."""
+    retry = _WPRetry(
+        total=max_retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(["GET", "HEAD", "OPTIONS", "PUT", "PATCH", "DELETE"]),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+    session = TimeoutSession(timeout=timeout)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+def get_session(url: str, **options) -> TimeoutSession:
+    """
+    Return the pooled session for the site (scheme + host) of `url`, creating it on first use.
+    Options (pool_size, timeout, max_retries, backoff_factor) only apply when the session is created.
+    """
+    key = _site_key(url)
+    with _lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = build_session(**options)
+            _sessions[key] = session
+        return session
+
+def close_sessions():
+    """Close and forget every pooled session."""
+    with _lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
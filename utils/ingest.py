@@ -0,0 +1,94 @@
+# utils/ingest.py
+import hashlib
+import io
+import json
+import multiprocessing
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from utils.file_utils import parse_uploaded_file, iter_uploaded_batches
+
+CACHE_ENTRIES = 64
+CONTEXT_CHARS = 4000  # per file, in the AI prompt
+CONTEXT_ROWS = 20     # sample rows per CSV/XLSX, in the AI prompt
+PARSE_TIMEOUT = 120   # seconds to wait for one file's parse
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+def _extension(name: str) -> str:
+    return name.rsplit(".", 1)[-1].lower() if "." in name else ""
+
+def parse_for_prompt(data: bytes, extension: str) -> dict:
+    """
+    Parse file bytes into a compact, prompt-ready context. Runs in a worker process, so only
+    the small result (not the full parse) is sent back and memoized.
+    """
+    if extension in ("csv", "xlsx"):
+        rows = next(iter_uploaded_batches(io.BytesIO(data), extension, batch_size=CONTEXT_ROWS), [])
+        return {"sample_rows": json.loads(json.dumps(rows, default=str))}
+    if extension == "json":
+        return {"content": data.decode("utf-8", errors="replace")[:CONTEXT_CHARS]}
+    # Only CONTEXT_CHARS reach the prompt, so PDF/DOCX extraction stops there.
+    parsed = parse_uploaded_file(io.BytesIO(data), extension, max_chars=CONTEXT_CHARS)
+    context = {}
+    if isinstance(parsed.get("content"), str):
+        context["content"] = parsed["content"][:CONTEXT_CHARS]
+    if parsed.get("metadata"):
+        context["metadata"] = {k: parsed["metadata"].get(k) for k in ("format", "size", "mode")}
+    return context
+
+def _safe_parse(data: bytes, extension: str) -> dict:
+    try:
+        return parse_for_prompt(data, extension)
+    except Exception as e:
+        return {"error": str(e)}
+
+def ingest_files(files, max_workers: int = None) -> list:
+    """
+    Parse uploaded files concurrently in a process pool and return one prompt context per file:
+    {"name", "sha256", **context}. Results are memoized by the SHA-256 of the file bytes, so
+    Streamlit reruns with identical uploads do not parse them again.
+    """
+    entries = []
+    for f in files:
+        data = f.getvalue() if hasattr(f, "getvalue") else f.read()
+        entries.append((f.name, hashlib.sha256(data).hexdigest(), data))
+    with _cache_lock:
+        todo = {digest: (name, data) for name, digest, data in entries if digest not in _cache}
+    failed = {}  # timeouts and crashed workers; not memoized, so a rerun tries again
+    if len(todo) == 1:
+        (digest, (name, data)), = todo.items()
+        parsed = {digest: _safe_parse(data, _extension(name))}
+    elif todo:
+        # Spawned, not forked: a fork of the threaded app can inherit a held lock (e.g. the
+        # metrics lock while job workers record) and hang in the child.
+        pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+        futures = {}
+        try:
+            futures = {digest: pool.submit(_safe_parse, data, _extension(name))
+                       for digest, (name, data) in todo.items()}
+            parsed = {}
+            for digest, future in futures.items():
+                try:
+                    parsed[digest] = future.result(timeout=PARSE_TIMEOUT)
+                except Exception as e:
+                    failed[digest] = {"error": f"Parsing failed: {e or type(e).__name__}"}
+        finally:
+            for future in futures.values():  # shutdown(cancel_futures=True) needs Python 3.9
+                future.cancel()
+            pool.shutdown(wait=False)
+    else:
+        parsed = {}
+    results = []
+    with _cache_lock:
+        for digest, context in parsed.items():
+            _cache[digest] = context
+            while len(_cache) > CACHE_ENTRIES:
+                _cache.popitem(last=False)
+        for name, digest, _ in entries:
+            context = _cache.get(digest) or parsed.get(digest) or failed.get(digest, {})
+            if digest in _cache:
+                _cache.move_to_end(digest)
+            results.append(dict(context, name=name, sha256=digest))
+    return results
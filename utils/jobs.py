@@ -0,0 +1,316 @@
+# utils/jobs.py
+import datetime
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from utils import journal
+from utils.auth import decrypt_data, encrypt_data, get_basic_auth_headers
+from utils.executor import execute_plan, RunStats, DEFAULT_CONCURRENCY
+from utils.logger import log_error
+
+JOBS_FILE = "job_queue.db"
+JOB_WORKERS = 8          # jobs executed at the same time (a multi-site run queues one job per site)
+CHECKPOINT_GROUP = 100   # pending actions loaded and dispatched per round
+POLL_INTERVAL = 2.0      # seconds an idle worker waits before looking for new jobs
+STREAM_POLL = 0.5        # seconds a worker waits for more actions of a job that is still receiving them
+INSERT_CHUNK = 1000
+
+_local = threading.local()
+_workers = []
+_workers_lock = threading.Lock()
+_wake = threading.Event()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    site TEXT NOT NULL,
+    endpoint TEXT NOT NULL,
+    label TEXT,
+    status TEXT NOT NULL,
+    credentials BLOB NOT NULL,
+    options TEXT NOT NULL,
+    op_id TEXT,
+    total INTEGER NOT NULL DEFAULT 0,
+    done INTEGER NOT NULL DEFAULT 0,
+    succeeded INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    sealed INTEGER NOT NULL DEFAULT 1,
+    summary TEXT,
+    created_at TEXT NOT NULL,
+    started_at TEXT,
+    finished_at TEXT
+);
+CREATE TABLE IF NOT EXISTS job_actions (
+    job_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    action TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    result TEXT,
+    PRIMARY KEY (job_id, seq)
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at);
+CREATE INDEX IF NOT EXISTS idx_job_actions_state ON job_actions (job_id, state, seq);
+"""
+# Columns added after the first release, created on databases that predate them.
+_ADDED_COLUMNS = (("sealed", "INTEGER NOT NULL DEFAULT 1"), ("summary", "TEXT"))
+
+def _conn() -> sqlite3.Connection:
+    """Per-thread connection to the job database (WAL mode lets the UI poll while workers write)."""
+    conn = getattr(_local, "conn", None)
+    if conn is None or getattr(_local, "path", None) != JOBS_FILE:
+        conn = sqlite3.connect(JOBS_FILE, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        existing = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+        for column, definition in _ADDED_COLUMNS:
+            if column not in existing:
+                try:
+                    with conn:
+                        conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {definition}")
+                except sqlite3.OperationalError:  # added by another thread in the meantime
+                    pass
+        conn.row_factory = sqlite3.Row
+        _local.conn, _local.path = conn, JOBS_FILE
+    return conn
+
+def _now() -> str:
+    return datetime.datetime.now().isoformat()
+
+def _append(conn: sqlite3.Connection, job_id: str, rows: list, total: int):
+    with conn:
+        conn.executemany("INSERT INTO job_actions (job_id, seq, action) VALUES (?, ?, ?)", rows)
+        conn.execute("UPDATE jobs SET total = ? WHERE job_id = ?", (total, job_id))
+
+def submit_job(site: dict, endpoint: str, actions, label: str = "", use_batch: bool = False,
+               max_workers: int = DEFAULT_CONCURRENCY, stream: bool = False) -> str:
+    """
+    Queue a plan for background execution on `site` and return the job id.
+    `actions` may be any iterable (e.g. a streamed CSV import); it is written to the queue in
+    chunks. The site's credentials are stored encrypted (utils.auth.encrypt_data) so the job can
+    be resumed after a restart.
+    With `stream`, the job is queued straight away and each action is committed as it arrives, so
+    workers apply a streamed AI plan while it is still being generated. The job is sealed when
+    `actions` is exhausted, raises or is interrupted (e.g. by a Streamlit rerun), keeping what
+    was queued so far. Without `stream`, a job whose `actions` raise is marked failed before the
+    exception is re-raised.
+    """
+    start_workers()
+    job_id = uuid.uuid4().hex
+    credentials = encrypt_data({"username": site["username"], "app_password": site["app_password"]})
+    options = json.dumps({"use_batch": use_batch, "max_workers": max_workers})
+    conn = _conn()
+    with conn:
+        conn.execute("INSERT INTO jobs (job_id, site, endpoint, label, status, credentials, options, sealed, "
+                     "created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                     (job_id, site["site_url"].rstrip("/"), endpoint, label, "queued" if stream else "preparing",
+                      credentials, options, int(not stream), _now()))
+    total, chunk = 0, []
+    try:
+        for action in actions:
+            chunk.append((job_id, total, json.dumps(action)))
+            total += 1
+            if stream or len(chunk) >= INSERT_CHUNK:
+                _append(conn, job_id, chunk, total)
+                chunk = []
+                _wake.set()
+        _append(conn, job_id, chunk, total)
+    except BaseException as e:
+        if not stream:
+            # Nothing of a half-written job runs; fail it now rather than at the next restart.
+            _finish(job_id, "failed", f"Submission failed: {e}")
+        raise
+    finally:
+        if stream:
+            with conn:
+                conn.execute("UPDATE jobs SET sealed = 1 WHERE job_id = ?", (job_id,))
+    if not stream:
+        with conn:
+            conn.execute("UPDATE jobs SET status = 'queued' WHERE job_id = ?", (job_id,))
+    _wake.set()
+    return job_id
+
+def get_job(job_id: str) -> dict:
+    """Status and progress of a job (credentials are never returned), or None."""
+    row = _conn().execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+    return _public(row) if row else None
+
+def list_jobs(site: str = None, limit: int = 20) -> list:
+    """Most recent jobs first, optionally for one site."""
+    query, params = "SELECT * FROM jobs", []
+    if site:
+        query += " WHERE site = ?"
+        params.append(site.rstrip("/"))
+    query += " ORDER BY created_at DESC LIMIT ?"
+    params.append(limit)
+    return [_public(row) for row in _conn().execute(query, params)]
+
+def _public(row: sqlite3.Row) -> dict:
+    job = dict(row)
+    job.pop("credentials", None)
+    job["options"] = json.loads(job["options"])
+    job["summary"] = json.loads(job["summary"]) if job.get("summary") else None
+    job["progress"] = round(job["done"] / job["total"], 3) if job["total"] else 0.0
+    return job
+
+def job_results(job_id: str, state: str = None, limit: int = 200) -> list:
+    """Checkpointed results of a job's actions ('done', 'failed' or 'pending'), in plan order."""
+    query, params = "SELECT seq, action, state, result FROM job_actions WHERE job_id = ?", [job_id]
+    if state:
+        query += " AND state = ?"
+        params.append(state)
+    query += " ORDER BY seq LIMIT ?"
+    params.append(limit)
+    rows = []
+    for row in _conn().execute(query, params):
+        action = json.loads(row["action"])
+        rows.append({"seq": row["seq"], "ID": action.get("id"), "Action": action.get("action"),
+                     "State": row["state"], "Result": row["result"]})
+    return rows
+
+def cancel_job(job_id: str) -> bool:
+    """Stop a queued or running job; running jobs stop after the current round of actions."""
+    conn = _conn()
+    with conn:
+        cursor = conn.execute("UPDATE jobs SET status = CASE status WHEN 'queued' THEN 'cancelled' "
+                              "ELSE 'cancelling' END WHERE job_id = ? AND status IN ('queued', 'running')",
+                              (job_id,))
+    return cursor.rowcount == 1
+
+def _claim_next() -> dict:
+    conn = _conn()
+    with conn:
+        row = conn.execute("SELECT * FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1").fetchone()
+        if row is None:
+            return None
+        cursor = conn.execute("UPDATE jobs SET status = 'running', started_at = COALESCE(started_at, ?) "
+                              "WHERE job_id = ? AND status = 'queued'", (_now(), row["job_id"]))
+    return dict(row) if cursor.rowcount == 1 else None
+
+def _pending_actions(job_id: str, limit: int) -> list:
+    rows = _conn().execute("SELECT seq, action FROM job_actions WHERE job_id = ? AND state = 'pending' "
+                           "ORDER BY seq LIMIT ?", (job_id, limit)).fetchall()
+    return [(row["seq"], json.loads(row["action"])) for row in rows]
+
+def _checkpoint(job_id: str, seq: int, success: bool, message: str):
+    conn = _conn()
+    with conn:
+        conn.execute("UPDATE job_actions SET state = ?, result = ? WHERE job_id = ? AND seq = ?",
+                     ("done" if success else "failed", message, job_id, seq))
+        conn.execute("UPDATE jobs SET done = done + 1, succeeded = succeeded + ?, failed = failed + ? "
+                     "WHERE job_id = ?", (int(success), int(not success), job_id))
+
+def _finish(job_id: str, status: str, error: str = None):
+    conn = _conn()
+    with conn:
+        conn.execute("UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE job_id = ?",
+                     (status, error, _now(), job_id))
+
+def _status(job_id: str) -> str:
+    return _conn().execute("SELECT status FROM jobs WHERE job_id = ?", (job_id,)).fetchone()["status"]
+
+def _sealed(job_id: str) -> bool:
+    return bool(_conn().execute("SELECT sealed FROM jobs WHERE job_id = ?", (job_id,)).fetchone()["sealed"])
+
+def _save_summary(job_id: str, stats: RunStats, elapsed: float, op_id: str, unchanged: int, bytes_saved: int):
+    summary = stats.summary(elapsed)
+    summary.update(operation_id=op_id, unchanged=unchanged, bytes_saved=bytes_saved)
+    conn = _conn()
+    with conn:
+        conn.execute("UPDATE jobs SET summary = ? WHERE job_id = ?", (json.dumps(summary), job_id))
+
+def _run_job(job: dict):
+    """
+    Execute a claimed job's pending actions in rounds of CHECKPOINT_GROUP, checkpointing each
+    result as it arrives. Only actions still pending are loaded, so a resumed job continues where
+    it stopped; an action that was in flight when the process died is sent again. A job that is
+    still receiving actions (submit_job with `stream`) waits for more until it is sealed.
+    After each round the run summary of executor.execute_plan (outcomes, throughput, latency
+    percentiles, operation id, unchanged items and bytes saved) is stored on the job, covering
+    the actions run since the job was last claimed.
+    """
+    job_id = job["job_id"]
+    api_base = job["site"] + "/wp-json/wp/v2"
+    stats, started = RunStats(), time.monotonic()
+    unchanged = bytes_saved = 0
+    try:
+        credentials = decrypt_data(job["credentials"])
+        headers = get_basic_auth_headers(credentials["username"], credentials["app_password"])
+        options = json.loads(job["options"])
+        op_id = job["op_id"]
+        if not op_id:
+            op_id = journal.begin_operation(api_base, job["endpoint"], label=job["label"] or job["endpoint"])
+            conn = _conn()
+            with conn:
+                conn.execute("UPDATE jobs SET op_id = ? WHERE job_id = ?", (op_id, job_id))
+        while True:
+            if _status(job_id) == "cancelling":
+                _finish(job_id, "cancelled")
+                return
+            # Read before the pending actions: once sealed, every action has been committed.
+            sealed = _sealed(job_id)
+            group = _pending_actions(job_id, CHECKPOINT_GROUP)
+            if not group:
+                if sealed:
+                    break
+                time.sleep(STREAM_POLL)
+                continue
+            # Results arrive in completion order; each carries the sequence number of its action.
+            waiting = {seq for seq, _ in group}
+
+            def checkpoint(result, done, total):
+                stats.add(result)
+                if result.get("_seq") in waiting:
+                    waiting.discard(result["_seq"])
+                    _checkpoint(job_id, result["_seq"], result["Success"], result["Result"])
+
+            _, round_summary = execute_plan(
+                api_base, headers, job["endpoint"], [dict(action, _seq=seq) for seq, action in group],
+                max_workers=options.get("max_workers", DEFAULT_CONCURRENCY), op_id=op_id,
+                on_result=checkpoint, use_batch=options.get("use_batch", False), keep_results=False)
+            for seq in sorted(waiting):
+                _checkpoint(job_id, seq, False, "No result reported.")
+            unchanged += round_summary["unchanged"]
+            bytes_saved += round_summary["bytes_saved"]
+            _save_summary(job_id, stats, time.monotonic() - started, op_id, unchanged, bytes_saved)
+        _finish(job_id, "done")
+    except Exception as e:
+        log_error(f"Job {job_id} failed: {e}", site=job["site"], endpoint=job["endpoint"])
+        _finish(job_id, "failed", str(e))
+
+def _worker_loop():
+    while True:
+        job = _claim_next()
+        if job is None:
+            _wake.wait(POLL_INTERVAL)
+            _wake.clear()
+            continue
+        _run_job(job)
+
+def recover_jobs() -> int:
+    """
+    Re-queue jobs left running or half-submitted by a previous process; returns how many.
+    Streamed jobs lost their producer with the process, so they are sealed with what they received.
+    """
+    conn = _conn()
+    with conn:
+        resumed = conn.execute("UPDATE jobs SET status = 'queued' WHERE status = 'running'").rowcount
+        conn.execute("UPDATE jobs SET sealed = 1 WHERE sealed = 0")
+        conn.execute("UPDATE jobs SET status = 'cancelled' WHERE status = 'cancelling'")
+        conn.execute("UPDATE jobs SET status = 'failed', error = 'Submission was interrupted.' "
+                     "WHERE status = 'preparing'")
+    return resumed
+
+def start_workers(count: int = JOB_WORKERS):
+    """Start the background worker threads once per process, resuming interrupted jobs first."""
+    with _workers_lock:
+        if _workers:
+            return
+        recover_jobs()
+        for i in range(count):
+            worker = threading.Thread(target=_worker_loop, name=f"job-worker-{i}", daemon=True)
+            worker.start()
+            _workers.append(worker)
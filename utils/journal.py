@@ -0,0 +1,215 @@
+# utils/journal.py
+import datetime
+import itertools
+import json
+import sqlite3
+import threading
+import uuid
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+JOURNAL_FILE = "rollback_journal.db"
+ROLLBACK_IN_FLIGHT = 4  # entries decoded and queued per rollback worker
+
+# Fields WordPress computes itself; they are never sent back on restore.
+READ_ONLY_FIELDS = {
+    "id", "guid", "link", "modified", "modified_gmt", "type", "permalink_template",
+    "generated_slug", "count", "taxonomy", "_links", "_embedded", "class_list",
+    "yoast_head", "yoast_head_json",
+}
+
+_local = threading.local()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS operations (
+    op_id TEXT PRIMARY KEY,
+    site TEXT NOT NULL,
+    endpoint TEXT NOT NULL,
+    label TEXT,
+    created_at TEXT NOT NULL,
+    rolled_back_at TEXT
+);
+CREATE TABLE IF NOT EXISTS entries (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    op_id TEXT NOT NULL,
+    site TEXT NOT NULL,
+    endpoint TEXT NOT NULL,
+    item_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    payload BLOB
+);
+CREATE INDEX IF NOT EXISTS idx_operations_site ON operations (site, created_at);
+CREATE INDEX IF NOT EXISTS idx_entries_op ON entries (op_id);
+CREATE INDEX IF NOT EXISTS idx_entries_item ON entries (site, endpoint, item_id);
+"""
+
+def _conn() -> sqlite3.Connection:
+    """Per-thread connection to the journal (WAL mode lets readers and writers overlap)."""
+    conn = getattr(_local, "conn", None)
+    if conn is None or getattr(_local, "path", None) != JOURNAL_FILE:
+        conn = sqlite3.connect(JOURNAL_FILE, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        conn.row_factory = sqlite3.Row
+        _local.conn, _local.path = conn, JOURNAL_FILE
+    return conn
+
+def _now() -> str:
+    return datetime.datetime.now().isoformat()
+
+def site_of(api_base: str) -> str:
+    """The site root an API base belongs to, e.g. https://example.com."""
+    return api_base.split("/wp-json", 1)[0].rstrip("/")
+
+def _pack(data: dict) -> bytes:
+    return zlib.compress(json.dumps(data).encode())
+
+def _unpack(blob: bytes) -> dict:
+    return json.loads(zlib.decompress(blob).decode()) if blob else {}
+
+def begin_operation(api_base: str, endpoint: str, label: str = "") -> str:
+    """Register a new operation and return its id."""
+    op_id = uuid.uuid4().hex
+    conn = _conn()
+    with conn:
+        conn.execute("INSERT INTO operations (op_id, site, endpoint, label, created_at) VALUES (?, ?, ?, ?, ?)",
+                     (op_id, site_of(api_base), endpoint, label, _now()))
+    return op_id
+
+def record_snapshots(op_id: str, api_base: str, endpoint: str, snapshots: dict):
+    """Append pre-images ({item_id: data}) of items about to be updated or deleted."""
+    rows = [(op_id, site_of(api_base), endpoint, str(item_id), "snapshot", _now(), _pack(data))
+            for item_id, data in snapshots.items()]
+    conn = _conn()
+    with conn:
+        conn.executemany("INSERT INTO entries (op_id, site, endpoint, item_id, kind, created_at, payload) "
+                         "VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+def record_created(op_id: str, api_base: str, endpoint: str, item_id):
+    """Append a marker for an item the operation created, so rollback can delete it."""
+    conn = _conn()
+    with conn:
+        conn.execute("INSERT INTO entries (op_id, site, endpoint, item_id, kind, created_at, payload) "
+                     "VALUES (?, ?, ?, ?, ?, ?, NULL)",
+                     (op_id, site_of(api_base), endpoint, str(item_id), "created", _now()))
+
+def list_operations(site: str = None, limit: int = 20, offset: int = 0) -> list:
+    """Most recent operations first, with their entry counts; payloads are not loaded."""
+    query = ("SELECT o.op_id, o.site, o.endpoint, o.label, o.created_at, o.rolled_back_at, "
+             "(SELECT COUNT(*) FROM entries e WHERE e.op_id = o.op_id) AS items FROM operations o")
+    params = []
+    if site:
+        query += " WHERE o.site = ?"
+        params.append(site)
+    query += " ORDER BY o.created_at DESC LIMIT ? OFFSET ?"
+    params += [limit, offset]
+    return [dict(row) for row in _conn().execute(query, params)]
+
+def last_operation(site: str) -> dict:
+    """
+    The most recent operation on `site` that has not been rolled back, or None. Operations that
+    recorded nothing (an empty plan, only failed creates) are skipped.
+    """
+    row = _conn().execute("SELECT * FROM operations o WHERE site = ? AND rolled_back_at IS NULL "
+                          "AND EXISTS (SELECT 1 FROM entries e WHERE e.op_id = o.op_id) "
+                          "ORDER BY created_at DESC LIMIT 1", (site,)).fetchone()
+    return dict(row) if row else None
+
+def iter_entries(op_id: str):
+    """Yield the journal entries of an operation, decompressing payloads one at a time."""
+    cursor = _conn().execute("SELECT endpoint, item_id, kind, payload FROM entries WHERE op_id = ? ORDER BY seq",
+                             (op_id,))
+    for row in cursor:
+        yield {"endpoint": row["endpoint"], "id": row["item_id"], "kind": row["kind"], "data": _unpack(row["payload"])}
+
+def rollback_entries(op_id: str):
+    """
+    The entries needed to undo an operation: every created item, and the earliest snapshot of
+    each other item. An item snapshotted several times (job rounds, a repeated id in an import)
+    is restored to its state before the operation, and items the operation created are only
+    deleted, not restored first.
+    """
+    created = {(row["endpoint"], row["item_id"]) for row in _conn().execute(
+        "SELECT endpoint, item_id FROM entries WHERE op_id = ? AND kind = 'created'", (op_id,))}
+    seen = set()
+    for entry in iter_entries(op_id):
+        key = (entry["endpoint"], entry["id"])
+        if key in seen or (entry["kind"] != "created" and key in created):
+            continue
+        seen.add(key)
+        yield entry
+
+def item_history(site: str, endpoint: str, item_id, limit: int = 20) -> list:
+    """Snapshots taken of one item, newest first."""
+    rows = _conn().execute("SELECT op_id, created_at, kind, payload FROM entries WHERE site = ? AND endpoint = ? "
+                           "AND item_id = ? ORDER BY seq DESC LIMIT ?", (site, endpoint, str(item_id), limit))
+    return [{"op_id": r["op_id"], "created_at": r["created_at"], "kind": r["kind"], "data": _unpack(r["payload"])}
+            for r in rows]
+
+def restorable_fields(data: dict) -> dict:
+    """
+    Turn a snapshot into a request body that restores it: read-only fields are dropped and
+    {"raw", "rendered"} objects are collapsed to raw (captured with context=edit) or rendered.
+    """
+    body = {}
+    for field, value in data.items():
+        if field in READ_ONLY_FIELDS:
+            continue
+        if isinstance(value, dict) and ("raw" in value or "rendered" in value):
+            value = value.get("raw", value.get("rendered"))
+        body[field] = value
+    return body
+
+def _restore_entry(api_base: str, headers: dict, entry: dict) -> (bool, str):
+    from utils.http_session import get_session
+    session = get_session(api_base)
+    url = f"{api_base}/{entry['endpoint']}/{entry['id']}"
+    try:
+        if entry["kind"] == "created":
+            resp = session.delete(url, headers=headers, params={"force": "true"})
+            verb = "removed"
+        else:
+            body = restorable_fields(entry["data"])
+            resp = session.post(url, headers=headers, json=body)
+            verb = "restored"
+            if resp.status_code in (404, 410):
+                # Permanently deleted: recreate it (WordPress assigns a new id).
+                resp = session.post(f"{api_base}/{entry['endpoint']}", headers=headers, json=body)
+                verb = "recreated"
+        if resp.status_code in (200, 201):
+            return True, f"ID {entry['id']} {verb}."
+        return False, f"ID {entry['id']}: HTTP {resp.status_code}: {resp.text}"
+    except Exception as e:
+        return False, f"ID {entry['id']}: {e}"
+
+def rollback_operation(op_id: str, api_base: str, headers: dict, max_workers: int = 4) -> (bool, str):
+    """
+    Undo every change of an operation in parallel: restore each item's earliest snapshot and
+    delete created items. Each item is touched once, so the parallel order does not matter.
+    Entries are read as workers free up, at most `max_workers` * ROLLBACK_IN_FLIGHT at a time.
+    """
+    entries = rollback_entries(op_id)
+    total, failures = 0, []
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        def submit(entry):
+            return pool.submit(_restore_entry, api_base, headers, entry)
+
+        pending = deque(submit(entry) for entry in itertools.islice(entries, max_workers * ROLLBACK_IN_FLIGHT))
+        while pending:
+            ok, msg = pending.popleft().result()
+            total += 1
+            if not ok:
+                failures.append(msg)
+            for entry in itertools.islice(entries, 1):
+                pending.append(submit(entry))
+    if not total:
+        return False, "Nothing recorded for this operation."
+    if failures:
+        return False, f"{len(failures)} of {total} items failed: " + "; ".join(failures[:5])
+    conn = _conn()
+    with conn:
+        conn.execute("UPDATE operations SET rolled_back_at = ? WHERE op_id = ?", (_now(), op_id))
+    return True, f"{total} items rolled back."
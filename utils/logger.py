@@ -1,33 +1,106 @@
 # utils/logger.py
+import atexit
 import datetime
 import json
 import os
+import threading
+import time
 
-LOG_FILE = "error_log.json"
-
-def log_error(error_message: str):
-    log_entry = {
-        "timestamp": datetime.datetime.now().isoformat(),
-        "error": error_message
-    }
-    logs = []
-    if os.path.exists(LOG_FILE):
-        try:
-            with open(LOG_FILE, "r") as f:
-                logs = json.load(f)
-        except:
-            logs = []
-    logs.append(log_entry)
-    with open(LOG_FILE, "w") as f:
-        json.dump(logs, f, indent=2)
-
-def get_recent_errors(limit: int = 10):
-    if os.path.exists(LOG_FILE):
-        try:
-            with open(LOG_FILE, "r") as f:
-                logs = json.load(f)
-            return logs[-limit:]
-        except:
-            return []
-    else:
-        return []
+try:
+    import fcntl
+except ImportError:  # Windows: appends are still serialised within the process
+    fcntl = None
+
+LOG_FILE = "error_log.jsonl"
+MAX_BYTES = 5 * 1024 * 1024
+BACKUP_COUNT = 3
+FLUSH_EVERY = 20       # buffered records
+FLUSH_INTERVAL = 2.0   # seconds
+STRUCTURED_FIELDS = ("site", "endpoint", "action_id", "latency", "status")
+
+_buffer = []
+_lock = threading.Lock()
+_last_flush = time.monotonic()
+
+def _rotate():
+    for i in range(BACKUP_COUNT - 1, 0, -1):
+        if os.path.exists(f"{LOG_FILE}.{i}"):
+            os.replace(f"{LOG_FILE}.{i}", f"{LOG_FILE}.{i + 1}")
+    os.replace(LOG_FILE, f"{LOG_FILE}.1")
+
+def flush():
+    """Append buffered records to the log under an exclusive file lock, rotating by size."""
+    global _last_flush
+    with _lock:
+        if not _buffer:
+            return
+        lines = "".join(_buffer)
+        _buffer.clear()
+        _last_flush = time.monotonic()
+        with open(LOG_FILE, "a", encoding="utf-8") as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.write(lines)
+                f.flush()
+                if f.tell() > MAX_BYTES:
+                    _rotate()
+            finally:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+atexit.register(flush)
+
+def log_event(level: str, message: str, **fields):
+    """Buffer a structured JSON-lines record; it is written every FLUSH_EVERY records or FLUSH_INTERVAL seconds."""
+    entry = {"timestamp": datetime.datetime.now().isoformat(), "level": level, "error": message}
+    entry.update({k: v for k, v in fields.items() if v is not None})
+    with _lock:
+        _buffer.append(json.dumps(entry, default=str) + "\n")
+        due = len(_buffer) >= FLUSH_EVERY or time.monotonic() - _last_flush >= FLUSH_INTERVAL
+    if due:
+        flush()
+
+def log_error(error_message: str, **fields):
+    """Log an error; structured fields (site, endpoint, action_id, latency, status, ...) are optional."""
+    log_event("error", error_message, **fields)
+
+def _tail_lines(path: str, block_size: int = 8192):
+    """Yield the lines of a file from last to first, reading backwards in blocks."""
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        remainder = b""
+        while position > 0:
+            read_size = min(block_size, position)
+            position -= read_size
+            f.seek(position)
+            block = f.read(read_size) + remainder
+            lines = block.split(b"\n")
+            remainder = lines.pop(0)
+            for line in reversed(lines):
+                if line.strip():
+                    yield line
+        if remainder.strip():
+            yield remainder
+
+def get_recent_errors(limit: int = 10, **filters):
+    """
+    Return up to `limit` most recent records, oldest first, reading the log from its tail.
+    Keyword filters keep only records whose field equals the given value (e.g. status=429).
+    """
+    flush()
+    matches = []
+    for path in [LOG_FILE] + [f"{LOG_FILE}.{i}" for i in range(1, BACKUP_COUNT + 1)]:
+        if not os.path.exists(path):
+            continue
+        for line in _tail_lines(path):
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if all(str(entry.get(k)) == str(v) for k, v in filters.items()):
+                matches.append(entry)
+                if len(matches) >= limit:
+                    return matches[::-1]
+    return matches[::-1]
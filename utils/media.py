@@ -0,0 +1,77 @@
+# utils/media.py
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+from utils.http_session import get_session
+
+MAX_DIMENSIONS = (1920, 1920)
+QUALITY = {"JPEG": 82, "WEBP": 80}
+MIME_TYPES = {"JPEG": ("image/jpeg", ".jpg"), "WEBP": ("image/webp", ".webp")}
+
+def prepare_image(file_obj, max_size=MAX_DIMENSIONS, fmt: str = "JPEG", quality: int = None) -> bytes:
+    """
+    Downscale and re-encode an image for upload. JPEGs are decoded at reduced scale with
+    draft(), orientation is applied before EXIF is dropped, and the result is saved without
+    metadata as an optimised JPEG or WebP.
+    """
+    from PIL import Image, ImageOps  # imported on first upload, not with the page
+    fmt = fmt.upper()
+    img = Image.open(file_obj)
+    if img.format == "JPEG":
+        img.draft("RGB", max_size)
+    img = ImageOps.exif_transpose(img)
+    img.thumbnail(max_size)
+    if fmt == "JPEG" and img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+    out = io.BytesIO()
+    options = {"quality": quality or QUALITY[fmt], "optimize": True}
+    if fmt == "JPEG":
+        options["progressive"] = True
+    img.save(out, format=fmt, **options)
+    return out.getvalue()
+
+def upload_media(api_base: str, headers: dict, data, filename: str, mime_type: str) -> (bool, dict):
+    """
+    Upload a file to /wp/v2/media. `data` may be bytes or a file object; file objects are
+    streamed as the request body. Returns (True, media) or (False, {"error": message}).
+    """
+    body = io.BytesIO(data) if isinstance(data, bytes) else data
+    upload_headers = dict(headers)
+    upload_headers["Content-Type"] = mime_type
+    upload_headers["Content-Disposition"] = f"attachment; filename*=UTF-8''{quote(filename)}"
+    try:
+        resp = get_session(api_base).post(f"{api_base}/media", headers=upload_headers, data=body)
+        if resp.status_code in (200, 201):
+            return True, resp.json()
+        else:
+            return False, {"error": f"HTTP {resp.status_code}: {resp.text}"}
+    except Exception as e:
+        return False, {"error": str(e)}
+
+def _process_upload(api_base: str, headers: dict, file_obj, max_size, fmt: str) -> dict:
+    name = getattr(file_obj, "name", "image")
+    result = {"file": name, "id": None, "source_url": None}
+    try:
+        file_obj.seek(0, os.SEEK_END)
+        result["bytes_before"] = file_obj.tell()
+        file_obj.seek(0)
+        data = prepare_image(file_obj, max_size, fmt)
+        result["bytes_after"] = len(data)
+    except Exception as e:
+        result["error"] = f"Could not process image: {e}"
+        return result
+    mime_type, extension = MIME_TYPES[fmt.upper()]
+    filename = os.path.splitext(os.path.basename(name))[0] + extension
+    success, media = upload_media(api_base, headers, data, filename, mime_type)
+    if success:
+        result.update(id=media.get("id"), source_url=media.get("source_url"))
+    else:
+        result["error"] = media["error"]
+    return result
+
+def upload_images(api_base: str, headers: dict, files: list, max_size=MAX_DIMENSIONS, fmt: str = "JPEG",
+                  max_workers: int = 4) -> list:
+    """Resize, re-encode and upload images concurrently; returns one result dict per file, in order."""
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(lambda f: _process_upload(api_base, headers, f, max_size, fmt), files))
@@ -0,0 +1,160 @@
+# utils/metrics.py
+import bisect
+import heapq
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+METRICS_FILE = "metrics.prom"
+EXPORT_INTERVAL = 30.0  # seconds between automatic exports to METRICS_FILE
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+RESERVOIR_SIZE = 1024   # recent samples kept per series for percentiles
+SLOWEST_SIZE = 20
+
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+_slowest = []
+_last_export = time.monotonic()
+
+class _Histogram:
+    __slots__ = ("bucket_counts", "count", "total", "samples")
+
+    def __init__(self):
+        self.bucket_counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.samples = deque(maxlen=RESERVOIR_SIZE)
+
+def _key(name: str, labels: dict) -> tuple:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+def observe(name: str, seconds: float, **labels):
+    """Record a duration in the latency histogram of `name` for these labels."""
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = _Histogram()
+        histogram.bucket_counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        histogram.count += 1
+        histogram.total += seconds
+        histogram.samples.append(seconds)
+        entry = (seconds, name, key[1], time.time())
+        if len(_slowest) < SLOWEST_SIZE:
+            heapq.heappush(_slowest, entry)
+        elif seconds > _slowest[0][0]:
+            heapq.heapreplace(_slowest, entry)
+    _maybe_export()
+
+def incr(name: str, value: float = 1, **labels):
+    """Add `value` to the counter `name` for these labels."""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+@contextmanager
+def span(name: str, **labels):
+    """
+    Time a block and record it with observe(). The yielded dict holds the labels, so the block
+    can add outcome labels (e.g. status) before the span closes.
+    """
+    started = time.perf_counter()
+    try:
+        yield labels
+    finally:
+        observe(name, time.perf_counter() - started, **labels)
+
+def _percentile(ordered: list, pct: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def latency_summary() -> list:
+    """p50/p95/p99 (over recent samples), mean and count for every histogram series."""
+    with _lock:
+        series = [(key, h.count, h.total, sorted(h.samples)) for key, h in _histograms.items()]
+    rows = []
+    for (name, labels), count, total, ordered in sorted(series):
+        rows.append({
+            "metric": name,
+            "labels": ", ".join(f"{k}={v}" for k, v in labels),
+            "count": count,
+            "mean_s": round(total / count, 4) if count else 0.0,
+            "p50_s": round(_percentile(ordered, 50), 4),
+            "p95_s": round(_percentile(ordered, 95), 4),
+            "p99_s": round(_percentile(ordered, 99), 4),
+        })
+    return rows
+
+def counter_summary() -> list:
+    with _lock:
+        items = sorted(_counters.items())
+    return [{"metric": name, "labels": ", ".join(f"{k}={v}" for k, v in labels), "value": value}
+            for (name, labels), value in items]
+
+def slowest_operations() -> list:
+    with _lock:
+        entries = sorted(_slowest, reverse=True)
+    return [{"metric": name, "labels": ", ".join(f"{k}={v}" for k, v in labels), "seconds": round(seconds, 4),
+             "at": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(at))}
+            for seconds, name, labels, at in entries]
+
+def _prom_labels(labels: tuple, extra: tuple = ()) -> str:
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+def to_prometheus() -> str:
+    """Render all metrics in the Prometheus text exposition format."""
+    with _lock:
+        histograms = sorted((key, list(h.bucket_counts), h.count, h.total) for key, h in _histograms.items())
+        counters = sorted(_counters.items())
+    lines, typed = [], set()
+    for (name, labels), bucket_counts, count, total in histograms:
+        metric = f"wpcm_{name}_seconds"
+        if metric not in typed:
+            lines.append(f"# TYPE {metric} histogram")
+            typed.add(metric)
+        cumulative = 0
+        for bound, bucket_count in zip(list(BUCKETS) + ["+Inf"], bucket_counts):
+            cumulative += bucket_count
+            lines.append(f"{metric}_bucket{_prom_labels(labels, (('le', str(bound)),))} {cumulative}")
+        lines.append(f"{metric}_sum{_prom_labels(labels)} {total}")
+        lines.append(f"{metric}_count{_prom_labels(labels)} {count}")
+    for (name, labels), value in counters:
+        metric = f"wpcm_{name}_total"
+        if metric not in typed:
+            lines.append(f"# TYPE {metric} counter")
+            typed.add(metric)
+        lines.append(f"{metric}{_prom_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+def export(path: str = None):
+    """Atomically write the Prometheus text to `path` (default METRICS_FILE)."""
+    path = path or METRICS_FILE
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(to_prometheus())
+    os.replace(tmp_path, path)
+
+def _maybe_export():
+    global _last_export
+    now = time.monotonic()
+    if now - _last_export < EXPORT_INTERVAL:
+        return
+    _last_export = now
+    try:
+        export()
+    except OSError:
+        pass
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+        _slowest.clear()
@@ -0,0 +1,307 @@
+# utils/mirror.py
+import datetime
+import html
+import json
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from utils.journal import site_of
+from utils.query import parse_command
+from utils.wp_api import iter_items, count_items
+
+MIRROR_FILE = "content_mirror.db"
+MIRRORED_ENDPOINTS = ("posts", "pages", "hp_listing", "hp_listing_category")
+# Taxonomy terms have no `modified` date, so they are always re-synced in full (they are small).
+TERM_ENDPOINTS = {"hp_listing_category", "categories", "tags"}
+MAX_AGE = 60  # seconds before a mirrored endpoint is considered stale
+PRICE_FIELDS = ("price", "hp_price", "regular_price", "_price")
+
+_local = threading.local()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    site TEXT NOT NULL,
+    endpoint TEXT NOT NULL,
+    item_id INTEGER NOT NULL,
+    modified TEXT,
+    payload BLOB NOT NULL,
+    PRIMARY KEY (site, endpoint, item_id)
+);
+CREATE TABLE IF NOT EXISTS sync_state (
+    site TEXT NOT NULL,
+    endpoint TEXT NOT NULL,
+    last_modified TEXT,
+    synced_at REAL NOT NULL,
+    PRIMARY KEY (site, endpoint)
+);
+CREATE TABLE IF NOT EXISTS item_docs (
+    doc_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    site TEXT NOT NULL,
+    endpoint TEXT NOT NULL,
+    item_id INTEGER NOT NULL,
+    price REAL,
+    UNIQUE (site, endpoint, item_id)
+);
+"""
+
+# Full-text index over the mirrored items; its rowid is item_docs.doc_id.
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE items_fts USING fts5(
+    title, content, excerpt, terms, fields,
+    tokenize = 'porter unicode61 remove_diacritics 2'
+);
+"""
+_fts_available = None
+
+def _conn() -> sqlite3.Connection:
+    conn = getattr(_local, "conn", None)
+    if conn is None or getattr(_local, "path", None) != MIRROR_FILE:
+        conn = sqlite3.connect(MIRROR_FILE, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        _local.conn, _local.path = conn, MIRROR_FILE
+        _ensure_index(conn)
+    return conn
+
+def _ensure_index(conn: sqlite3.Connection):
+    """Create the full-text index on first use (indexing items mirrored before it existed)."""
+    global _fts_available
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'items_fts'").fetchone():
+        _fts_available = True
+        return
+    try:
+        with conn:
+            conn.executescript(_FTS_SCHEMA)
+            conn.execute("DELETE FROM item_docs")
+            rows = conn.execute("SELECT site, endpoint, payload FROM items").fetchall()
+            for site, endpoint, payload in rows:
+                _index(conn, site, endpoint, json.loads(zlib.decompress(payload).decode()))
+        _fts_available = True
+    except sqlite3.OperationalError:  # SQLite built without FTS5: search is disabled
+        _fts_available = False
+
+def _text(value) -> str:
+    if isinstance(value, dict):
+        value = value.get("raw", value.get("rendered"))
+    if not isinstance(value, str):
+        return ""
+    return html.unescape(re.sub(r"<[^>]+>", " ", value))
+
+def _price(item: dict):
+    for source in (item, item.get("meta") if isinstance(item.get("meta"), dict) else {}):
+        for field in PRICE_FIELDS:
+            value = source.get(field)
+            if isinstance(value, list):
+                value = value[0] if value else None
+            try:
+                return float(value)
+            except (TypeError, ValueError):
+                continue
+    return None
+
+def _document(item: dict) -> tuple:
+    """(title, content, excerpt, terms, fields) text of an item for the full-text index."""
+    terms, fields = [], []
+    for key, value in item.items():
+        if isinstance(value, list) and value and all(isinstance(v, int) and not isinstance(v, bool) for v in value) \
+                and not any(word in key for word in ("image", "gallery", "media", "attachment")):
+            terms += [f"t{term_id}" for term_id in value]  # taxonomy term ids, resolved by name at query time
+        elif key == "class_list" and isinstance(value, list):
+            terms += [str(cls).replace("-", " ").replace("_", " ") for cls in value]
+        elif key.startswith("hp_") and isinstance(value, (str, int, float)) and not isinstance(value, bool):
+            fields.append(_text(value) if isinstance(value, str) else str(value))
+    meta = item.get("meta")
+    if isinstance(meta, dict):
+        for value in meta.values():
+            if isinstance(value, list):
+                fields += [_text(v) for v in value if isinstance(v, str)]
+            elif isinstance(value, (str, int, float)) and not isinstance(value, bool):
+                fields.append(_text(value) if isinstance(value, str) else str(value))
+    return (_text(item.get("title", item.get("name"))), _text(item.get("content", item.get("description"))),
+            _text(item.get("excerpt")), " ".join(terms), " ".join(fields))
+
+def _index(conn: sqlite3.Connection, site: str, endpoint: str, item: dict):
+    row = conn.execute("SELECT doc_id FROM item_docs WHERE site = ? AND endpoint = ? AND item_id = ?",
+                       (site, endpoint, item["id"])).fetchone()
+    if row:
+        doc_id = row[0]
+        conn.execute("DELETE FROM items_fts WHERE rowid = ?", (doc_id,))
+        conn.execute("UPDATE item_docs SET price = ? WHERE doc_id = ?", (_price(item), doc_id))
+    else:
+        doc_id = conn.execute("INSERT INTO item_docs (site, endpoint, item_id, price) VALUES (?, ?, ?, ?)",
+                              (site, endpoint, item["id"], _price(item))).lastrowid
+    conn.execute("INSERT INTO items_fts (rowid, title, content, excerpt, terms, fields) VALUES (?, ?, ?, ?, ?, ?)",
+                 (doc_id,) + _document(item))
+
+def _state(site: str, endpoint: str):
+    return _conn().execute("SELECT last_modified, synced_at FROM sync_state WHERE site = ? AND endpoint = ?",
+                           (site, endpoint)).fetchone()
+
+def _upsert(site: str, endpoint: str, items) -> (int, str):
+    """Store items; returns (count, newest `modified` value seen)."""
+    count, newest = 0, None
+    conn = _conn()
+    with conn:
+        for item in items:
+            modified = item.get("modified")
+            conn.execute("INSERT OR REPLACE INTO items (site, endpoint, item_id, modified, payload) "
+                         "VALUES (?, ?, ?, ?, ?)",
+                         (site, endpoint, item["id"], modified, zlib.compress(json.dumps(item).encode())))
+            if _fts_available:
+                _index(conn, site, endpoint, item)
+            count += 1
+            if modified and (newest is None or modified > newest):
+                newest = modified
+    return count, newest
+
+def _local_ids(site: str, endpoint: str) -> set:
+    return {row[0] for row in _conn().execute("SELECT item_id FROM items WHERE site = ? AND endpoint = ?",
+                                             (site, endpoint))}
+
+def _delete_ids(site: str, endpoint: str, ids) -> int:
+    conn = _conn()
+    keys = [(site, endpoint, item_id) for item_id in ids]
+    with conn:
+        conn.executemany("DELETE FROM items WHERE site = ? AND endpoint = ? AND item_id = ?", keys)
+        if _fts_available:
+            conn.executemany("DELETE FROM items_fts WHERE rowid = (SELECT doc_id FROM item_docs "
+                             "WHERE site = ? AND endpoint = ? AND item_id = ?)", keys)
+            conn.executemany("DELETE FROM item_docs WHERE site = ? AND endpoint = ? AND item_id = ?", keys)
+    return len(ids)
+
+def _overlap(modified: str) -> str:
+    """Step the cursor back one second so items saved in the same second are not missed."""
+    return (datetime.datetime.fromisoformat(modified) - datetime.timedelta(seconds=1)).isoformat()
+
+def sync(api_base: str, headers: dict, endpoint: str, full: bool = False) -> dict:
+    """
+    Bring the local mirror of `endpoint` up to date.
+    After the first full crawl, only items with `modified_after` the last seen change are fetched
+    (`orderby=modified`). Deletions are detected by comparing X-WP-Total with the local count and,
+    only when they differ, diffing an id-only (`_fields=id`) listing.
+    Returns {"updated": n, "deleted": n, "full": bool}.
+    """
+    site = site_of(api_base)
+    state = _state(site, endpoint)
+    full = full or state is None or endpoint in TERM_ENDPOINTS
+    params = {"context": "edit"}
+    if not full:
+        params.update(orderby="modified", order="asc")
+        if state[0]:
+            params["modified_after"] = _overlap(state[0])
+    seen_ids = set()
+
+    def tracked(items):
+        for item in items:
+            seen_ids.add(item["id"])
+            yield item
+
+    updated, newest = _upsert(site, endpoint, tracked(iter_items(api_base, headers, endpoint, params=params)))
+    if full:
+        deleted = _delete_ids(site, endpoint, _local_ids(site, endpoint) - seen_ids)
+    else:
+        deleted = 0
+        if count_items(api_base, headers, endpoint) != len(_local_ids(site, endpoint)):
+            remote = {item["id"] for item in iter_items(api_base, headers, endpoint, fields=["id"])}
+            deleted = _delete_ids(site, endpoint, _local_ids(site, endpoint) - remote)
+    last_modified = max(filter(None, [newest, state[0] if state else None]), default=None)
+    conn = _conn()
+    with conn:
+        conn.execute("INSERT OR REPLACE INTO sync_state (site, endpoint, last_modified, synced_at) VALUES (?, ?, ?, ?)",
+                     (site, endpoint, last_modified, time.time()))
+    return {"updated": updated, "deleted": deleted, "full": full}
+
+def age(api_base: str, endpoint: str):
+    """Seconds since `endpoint` was last synced, or None if it has never been mirrored."""
+    state = _state(site_of(api_base), endpoint)
+    return time.time() - state[1] if state else None
+
+def is_stale(api_base: str, endpoint: str, max_age: float = MAX_AGE) -> bool:
+    current = age(api_base, endpoint)
+    return current is None or current > max_age
+
+def get_items(api_base: str, endpoint: str) -> list:
+    """All mirrored items of `endpoint`, in id order."""
+    rows = _conn().execute("SELECT payload FROM items WHERE site = ? AND endpoint = ? ORDER BY item_id",
+                           (site_of(api_base), endpoint))
+    return [json.loads(zlib.decompress(row[0]).decode()) for row in rows]
+
+def ensure_fresh(api_base: str, headers: dict, endpoint: str, max_age: float = MAX_AGE) -> list:
+    """Sync `endpoint` if it is stale, then return its mirrored items."""
+    if is_stale(api_base, endpoint, max_age):
+        sync(api_base, headers, endpoint)
+    return get_items(api_base, endpoint)
+
+def get_items_by_ids(api_base: str, endpoint: str, ids) -> list:
+    """Mirrored items with the given ids, in id order."""
+    ids = sorted({int(item_id) for item_id in ids})
+    items, conn = [], _conn()
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        rows = conn.execute(f"SELECT payload FROM items WHERE site = ? AND endpoint = ? AND item_id IN "
+                            f"({','.join('?' * len(chunk))}) ORDER BY item_id", [site_of(api_base), endpoint] + chunk)
+        items += [json.loads(zlib.decompress(row[0]).decode()) for row in rows]
+    return items
+
+def _matching_ids(site: str, endpoints, expression: str = None, min_price: float = None,
+                  max_price: float = None) -> set:
+    query = f"SELECT item_id FROM item_docs WHERE site = ? AND endpoint IN ({','.join('?' * len(endpoints))})"
+    params = [site] + list(endpoints)
+    if expression:
+        query += " AND doc_id IN (SELECT rowid FROM items_fts WHERE items_fts MATCH ?)"
+        params.append(expression)
+    if min_price is not None:
+        query += " AND price >= ?"
+        params.append(min_price)
+    if max_price is not None:
+        query += " AND price <= ?"
+        params.append(max_price)
+    return {row[0] for row in _conn().execute(query, params)}
+
+def _has_prices(site: str, endpoint: str) -> bool:
+    return _conn().execute("SELECT 1 FROM item_docs WHERE site = ? AND endpoint = ? AND price IS NOT NULL LIMIT 1",
+                           (site, endpoint)).fetchone() is not None
+
+def search(api_base: str, endpoint: str, command: str) -> (set, dict):
+    """
+    Resolve a natural-language command to the ids of matching mirrored items, e.g.
+    "all Spanish villa listings under 500k". Keywords (see utils.query.parse_command) are matched
+    against titles, content, excerpts, HivePress/meta fields and the names of assigned taxonomy
+    terms; keywords that match nothing (usually words describing the edit) are ignored. Items must
+    match all remaining keywords, or any of them if no item matches all. Price bounds only apply
+    to endpoints whose items have a price.
+    Returns (ids, details); ids is None when the command names no usable criteria, nothing
+    matches or the index is unavailable, meaning every item is a candidate.
+    """
+    parsed = parse_command(command)
+    details = dict(parsed, used=[], ignored=[], no_match=False)
+    _conn()
+    if not _fts_available:
+        return None, details
+    site = site_of(api_base)
+    if not _has_prices(site, endpoint):
+        details["min_price"] = details["max_price"] = None
+    clauses = []
+    for keyword in parsed["keywords"]:
+        phrase = '"' + keyword.replace('"', "") + '"'
+        term_ids = _matching_ids(site, TERM_ENDPOINTS, f"title : {phrase}")
+        clause = phrase
+        if term_ids:
+            clause = f"({phrase} OR terms : (" + " OR ".join(f'"t{term_id}"' for term_id in sorted(term_ids)) + "))"
+        if _matching_ids(site, [endpoint], clause):
+            clauses.append(clause)
+            details["used"].append(keyword)
+        else:
+            details["ignored"].append(keyword)
+    if not clauses and details["min_price"] is None and details["max_price"] is None:
+        return None, details
+    ids = _matching_ids(site, [endpoint], " AND ".join(clauses) or None, details["min_price"], details["max_price"])
+    if not ids and len(clauses) > 1:
+        ids = _matching_ids(site, [endpoint], " OR ".join(clauses), details["min_price"], details["max_price"])
+    if not ids:
+        details["no_match"] = True
+        return None, details
+    return ids, details
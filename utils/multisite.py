@@ -0,0 +1,121 @@
+# utils/multisite.py
+import datetime
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from utils import mirror
+from utils.auth import get_basic_auth_headers
+from utils.logger import log_error
+
+MAX_SITES_IN_FLIGHT = 8
+
+def site_api_base(site: dict) -> str:
+    return site["site_url"].rstrip("/") + "/wp-json/wp/v2"
+
+def site_headers(site: dict) -> dict:
+    return get_basic_auth_headers(site["username"], site["app_password"])
+
+def remap_actions(actions: list, source_items: list, target_items: list, match_field: str = "slug") -> (list, list):
+    """
+    Translate a plan made against one site to another site's ids by matching items on
+    `match_field` (slug by default). Creates are kept as they are.
+    Returns (mapped actions, actions that have no counterpart on the target site).
+    """
+    source_keys = {str(item["id"]): item.get(match_field) for item in source_items if "id" in item}
+    target_ids = {item.get(match_field): item["id"] for item in target_items if item.get(match_field)}
+    mapped, unmatched = [], []
+    for action in actions:
+        if action["action"] == "create":
+            mapped.append(action)
+            continue
+        target_id = target_ids.get(source_keys.get(str(action["id"])))
+        if target_id is None:
+            unmatched.append(action)
+        else:
+            mapped.append(dict(action, id=target_id))
+    return mapped, unmatched
+
+def _site_actions(site: dict, items: list, actions: list = None, planner=None, source_items: list = None) -> (list, int):
+    """(actions for `site`, number of actions without a counterpart there) for plan_site."""
+    if planner is not None:
+        return list(planner(site, items)), 0
+    if source_items is not None:
+        mapped, unmatched = remap_actions(actions or [], source_items, items)
+        return mapped, len(unmatched)
+    return list(actions or []), 0
+
+def plan_site(site: dict, endpoint: str, actions: list = None, planner=None, source_items: list = None) -> dict:
+    """
+    Work out the actions for one site without applying them; never raises, so one failing site
+    does not affect the others.
+    Pass `actions` planned on another site (with that site's `source_items`, to remap ids by slug),
+    or a `planner(site, items) -> actions` to plan against this site's own items.
+    Returns {"site", "actions", "planned", "unmatched", "error"?, "elapsed_s"}.
+    """
+    report = {"site": site["site_url"], "actions": [], "planned": 0, "unmatched": 0}
+    started = time.monotonic()
+    try:
+        items = mirror.ensure_fresh(site_api_base(site), site_headers(site), endpoint)
+        site_actions, report["unmatched"] = _site_actions(site, items, actions, planner, source_items)
+        report.update(actions=site_actions, planned=len(site_actions))
+    except Exception as e:
+        log_error(f"Multi-site planning failed for {site['site_url']}: {e}", site=site["site_url"], endpoint=endpoint)
+        report["error"] = str(e)
+    report["elapsed_s"] = round(time.monotonic() - started, 3)
+    return report
+
+def plan_across_sites(sites: list, endpoint: str, actions: list = None, planner=None, source_items: list = None,
+                      max_sites: int = MAX_SITES_IN_FLIGHT, on_site_done=None) -> list:
+    """
+    Plan one command for many sites concurrently without applying anything, so the plans can be
+    reviewed first and then applied as one background job per site (utils.jobs.submit_job).
+    `on_site_done(plan, done, total)` is called from the calling thread as each site finishes.
+    Returns one plan_site report per site, in input order.
+    """
+    plans = [None] * len(sites)
+    with ThreadPoolExecutor(max_workers=max(1, min(max_sites, len(sites)))) as pool:
+        futures = {pool.submit(plan_site, site, endpoint, actions, planner, source_items): i
+                   for i, site in enumerate(sites)}
+        for done, future in enumerate(as_completed(futures), 1):
+            plans[futures[future]] = future.result()
+            if on_site_done:
+                on_site_done(plans[futures[future]], done, len(sites))
+    return plans
+
+def _elapsed(job: dict) -> float:
+    if not (job.get("started_at") and job.get("finished_at")):
+        return None
+    started, finished = (datetime.datetime.fromisoformat(job[key]) for key in ("started_at", "finished_at"))
+    return round((finished - started).total_seconds(), 3)
+
+def summarize_sites(site_jobs: list) -> dict:
+    """
+    Aggregate the background jobs of a multi-site run, given as [(site_url, job)] with `job` as
+    returned by utils.jobs.get_job, into totals across all sites. The wall time and the slowest
+    site only cover sites whose job has finished.
+    """
+    finished = []
+    for site, job in site_jobs:
+        elapsed = _elapsed(job)
+        if elapsed is not None:
+            finished.append((site, job, elapsed))
+    slowest = max(finished, key=lambda entry: entry[2], default=None)
+    wall = None
+    if finished:
+        wall = (max(datetime.datetime.fromisoformat(job["finished_at"]) for _, job, _ in finished)
+                - min(datetime.datetime.fromisoformat(job["started_at"]) for _, job, _ in finished))
+    return {
+        "sites": len(site_jobs),
+        "sites_done": sum(1 for _, job in site_jobs if job["status"] == "done" and not job["failed"]),
+        "sites_failed": [site for site, job in site_jobs
+                         if job["status"] in ("failed", "cancelled") or job["failed"]],
+        "sites_pending": sum(1 for _, job in site_jobs if job["status"] in ("preparing", "queued", "running",
+                                                                             "cancelling")),
+        "actions": sum(job["total"] for _, job in site_jobs),
+        "done": sum(job["done"] for _, job in site_jobs),
+        "succeeded": sum(job["succeeded"] for _, job in site_jobs),
+        "failed": sum(job["failed"] for _, job in site_jobs),
+        "elapsed_s": round(wall.total_seconds(), 3) if wall is not None else None,
+        "slowest_site": slowest[0] if slowest else None,
+        "slowest_site_s": slowest[2] if slowest else 0.0,
+        "operation_ids": {site: job["op_id"] for site, job in site_jobs if job.get("op_id")},
+    }
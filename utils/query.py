@@ -0,0 +1,87 @@
+# utils/query.py
+import re
+
+# Words that say what to do rather than which items to do it to.
+STOPWORDS = {
+    "a", "about", "after", "all", "also", "an", "and", "any", "are", "as", "at", "be", "by", "each", "every",
+    "for", "from", "have", "in", "into", "is", "it", "its", "me", "my", "new", "no", "not", "of", "on", "only",
+    "or", "our", "please", "so", "some", "that", "the", "their", "them", "these", "they", "this", "those", "to",
+    "up", "we", "which", "with", "without", "you", "your", "ones", "one", "there", "where", "whose",
+    "add", "append", "change", "create", "delete", "edit", "fix", "improve", "make", "modify", "prepend",
+    "remove", "rename", "replace", "rewrite", "set", "translate", "update", "write", "publish", "unpublish",
+    "item", "items", "listing", "listings", "post", "posts", "page", "pages", "entry", "entries", "product",
+    "products", "title", "titles", "content", "contents", "excerpt", "excerpts", "description", "descriptions",
+    "price", "prices", "status", "slug", "slugs", "text", "field", "fields", "category", "categories",
+    "tag", "tags", "meta", "seo", "cost", "costing", "priced", "than", "less", "more", "cheaper",
+}
+_AMOUNT = r"[€$£]?\s*(\d[\d.,]*)\s*(k|m|mio|thousand|million)?\b\s*(?:€|euros?|eur|usd|dollars?|gbp)?"
+_BETWEEN = re.compile(r"\bbetween\s+" + _AMOUNT + r"\s+and\s+" + _AMOUNT)
+_MAX = re.compile(r"\b(?:under|below|less than|cheaper than|up to|at most|max(?:imum)?|no more than)\s+" + _AMOUNT)
+_MIN = re.compile(r"\b(?:over|above|more than|at least|min(?:imum)?|from)\s+" + _AMOUNT)
+_QUOTED = re.compile(r"\"[^\"]*\"|“[^”]*”|'[^']{2,}'")
+_CURRENCY = re.compile(r"[€$£]|\b(?:eur|euros?|usd|dollars?|gbp)\b")
+_YEAR = re.compile(r"(?:19|20)\d\d")
+# Words that may follow a bare amount that is still a price ("under 500000 in Marbella");
+# any other word makes it a count of something else ("more than 500 words", "up to 5 posts").
+_AFTER_PRICE = {"and", "or", "in", "on", "at", "for", "with", "within", "near", "but", "that", "which", "where",
+                "to", "only", "please", "then", "each", "per"}
+# The new value of an edit ("change Marbella to Malaga", "replace X with Y") is not a search term.
+_NEW_VALUE = re.compile(r"\b(?:change|rename|set|switch|convert|turn|update|replace|swap)\b.*?"
+                        r"(?<!up )\b(?:to|into|with)\s+(.+?)(?=\s+(?:in|on|for|across|within|where|of)\b|[,.;!?]|$)")
+_MULTIPLIERS = {"k": 1e3, "thousand": 1e3, "m": 1e6, "mio": 1e6, "million": 1e6}
+
+def parse_amount(number: str, unit: str = None) -> float:
+    """'500' + 'k' -> 500000.0; '1.2' + 'm' -> 1200000.0; '500,000' and '500.000' -> 500000.0."""
+    number = number.rstrip(".,")
+    if re.fullmatch(r"\d{1,3}([.,]\d{3})+", number):
+        number = re.sub(r"[.,]", "", number)
+    else:
+        number = number.replace(",", ".")
+    return float(number) * _MULTIPLIERS.get((unit or "").lower(), 1)
+
+def _is_price(text: str, match) -> bool:
+    """
+    Whether an amount matched in `text` reads as a price: it has a currency or a k/m unit, or it
+    is a bare number that is neither a year nor followed by what it counts ("500 words").
+    """
+    numbers = match.groups()[0::2]
+    units = match.groups()[1::2]
+    if _CURRENCY.search(match.group(0)) or any(units):
+        return True
+    if any(_YEAR.fullmatch(number.rstrip(".,")) for number in numbers):
+        return False
+    following = re.match(r"\s*([^\W\d_]+)", text[match.end():])
+    return following is None or following.group(1) in _AFTER_PRICE
+
+def _find_price(pattern: re.Pattern, text: str):
+    return next((match for match in pattern.finditer(text) if _is_price(text, match)), None)
+
+def parse_command(command: str) -> dict:
+    """
+    Split a natural-language command into search keywords and price bounds, e.g.
+    "all Spanish villa listings under 500k" -> {"keywords": ["spanish", "villa"], "max_price": 500000.0}.
+    Quoted text and the new value of an edit ("... to Malaga") are not search terms; the latter is
+    returned as "values". Numbers that are years or counts ("from 2019", "500 words") are not prices.
+    """
+    text = _QUOTED.sub(" ", (command or "").lower())
+    parsed = {"keywords": [], "min_price": None, "max_price": None, "values": []}
+    match = _find_price(_BETWEEN, text)
+    if match:
+        parsed["min_price"] = parse_amount(match.group(1), match.group(2))
+        parsed["max_price"] = parse_amount(match.group(3), match.group(4))
+        text = text[:match.start()] + " " + text[match.end():]
+    for key, pattern in (("max_price", _MAX), ("min_price", _MIN)):
+        match = _find_price(pattern, text)
+        if match and parsed[key] is None:
+            parsed[key] = parse_amount(match.group(1), match.group(2))
+            text = text[:match.start()] + " " + text[match.end():]
+    match = _NEW_VALUE.search(text)
+    if match:
+        parsed["values"] = [word for word in re.findall(r"[^\W\d_][\w'-]*", match.group(1))
+                            if word not in STOPWORDS]
+        text = text[:match.start(1)] + " " + text[match.end(1):]
+    for word in re.findall(r"[^\W\d_][\w'-]*", text):
+        word = re.sub(r"'s$", "", word).strip("'-")
+        if len(word) > 1 and word not in STOPWORDS and word not in parsed["keywords"]:
+            parsed["keywords"].append(word)
+    return parsed
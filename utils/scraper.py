@@ -1,17 +1,82 @@
 # utils/scraper.py
-import requests
-from bs4 import BeautifulSoup
+import hashlib
+import json
+import os
 import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
+from urllib.parse import urlsplit
+from utils import metrics
+from utils.http_session import get_session
 
-def fetch_page(url: str, timeout: int = 10) -> BeautifulSoup:
-    headers = {
-        "User-Agent": "Mozilla/5.0 (compatible; AI-WP-Content-Manager/1.0; +https://yourdomain.com/)"
+if TYPE_CHECKING:
+    from bs4 import BeautifulSoup
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (compatible; AI-WP-Content-Manager/1.0; +https://yourdomain.com/)"
+}
+CACHE_DIR = ".http_cache"
+PER_HOST_CONCURRENCY = 2
+PER_HOST_DELAY = 0.5  # minimum seconds between request starts to the same host
+YOUTUBE_EMBED = re.compile("youtube.com/embed/")
+
+_hosts = {}
+_hosts_lock = threading.Lock()
+
+def _cache_path(url: str) -> str:
+    return os.path.join(CACHE_DIR, hashlib.sha256(url.encode()).hexdigest() + ".json")
+
+def _load_cached(url: str) -> dict:
+    try:
+        with open(_cache_path(url), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return None
+
+def _store_cached(url: str, response):
+    entry = {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "text": response.text,
     }
-    response = requests.get(url, headers=headers, timeout=timeout)
+    if not (entry["etag"] or entry["last_modified"]):
+        return
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp_path = _cache_path(url) + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(entry, f)
+    os.replace(tmp_path, _cache_path(url))
+
+def fetch_html(url: str, timeout: int = 10, use_cache: bool = True) -> str:
+    """
+    Fetch a page's HTML. With `use_cache`, a copy stored on disk is revalidated with a
+    conditional GET (If-None-Match / If-Modified-Since) and reused on 304 Not Modified.
+    """
+    headers = dict(HEADERS)
+    cached = _load_cached(url) if use_cache else None
+    if cached:
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+    response = get_session(url).get(url, headers=headers, timeout=timeout)
+    if cached and response.status_code == 304:
+        metrics.incr("cache_lookups", cache="scraper_http", result="hit")
+        return cached["text"]
+    if use_cache:
+        metrics.incr("cache_lookups", cache="scraper_http", result="miss")
     response.raise_for_status()
-    return BeautifulSoup(response.text, "html.parser")
+    if use_cache:
+        _store_cached(url, response)
+    return response.text
 
-def extract_images(soup: BeautifulSoup) -> list:
+def fetch_page(url: str, timeout: int = 10) -> "BeautifulSoup":
+    from bs4 import BeautifulSoup  # imported on the first scrape, not when a page loads
+    return BeautifulSoup(fetch_html(url, timeout), "html.parser")
+
+def extract_images(soup: "BeautifulSoup") -> list:
     images = []
     for img in soup.find_all("img"):
         src = img.get("src")
@@ -19,14 +84,14 @@ def extract_images(soup: BeautifulSoup) -> list:
             images.append(src)
     return images
 
-def extract_text(soup: BeautifulSoup) -> str:
+def extract_text(soup: "BeautifulSoup") -> str:
     paragraphs = soup.find_all("p")
     if paragraphs:
         return "\n".join([p.get_text() for p in paragraphs])
     else:
         return soup.get_text(separator="\n")
 
-def extract_meta(soup: BeautifulSoup) -> dict:
+def extract_meta(soup: "BeautifulSoup") -> dict:
     meta_data = {}
     for meta in soup.find_all("meta"):
         name = meta.get("name", "").lower()
@@ -34,20 +99,69 @@ def extract_meta(soup: BeautifulSoup) -> dict:
             meta_data[name] = meta.get("content", "")
     return meta_data
 
-def extract_youtube_video(soup: BeautifulSoup) -> str:
-    iframe = soup.find("iframe", src=re.compile("youtube.com/embed/"))
+def extract_youtube_video(soup: "BeautifulSoup") -> str:
+    iframe = soup.find("iframe", src=YOUTUBE_EMBED)
     if iframe:
         return iframe.get("src")
     return ""
 
+def extract_all(soup: "BeautifulSoup") -> dict:
+    """Extract text, images, meta and the first YouTube embed in a single walk over the tree."""
+    paragraphs, images, meta, youtube = [], [], {}, ""
+    for tag in soup.find_all(True):
+        name = tag.name
+        if name == "p":
+            paragraphs.append(tag.get_text())
+        elif name == "img":
+            src = tag.get("src")
+            if src:
+                images.append(src)
+        elif name == "meta":
+            meta_name = tag.get("name", "").lower()
+            if meta_name in ["description", "keywords"]:
+                meta[meta_name] = tag.get("content", "")
+        elif name == "iframe" and not youtube:
+            src = tag.get("src") or ""
+            if YOUTUBE_EMBED.search(src):
+                youtube = src
+    return {
+        "text": "\n".join(paragraphs) if paragraphs else soup.get_text(separator="\n"),
+        "images": images,
+        "meta": meta,
+        "youtube": youtube
+    }
+
 def scrape_website(url: str) -> dict:
-    try:
-        soup = fetch_page(url)
-        return {
-            "text": extract_text(soup),
-            "images": extract_images(soup),
-            "meta": extract_meta(soup),
-            "youtube": extract_youtube_video(soup)
-        }
-    except Exception as e:
-        return {"error": str(e)}
+    with metrics.span("scrape", host=urlsplit(url).netloc.lower()) as labels:
+        try:
+            return extract_all(fetch_page(url))
+        except Exception as e:
+            labels["status"] = "error"
+            return {"error": str(e)}
+
+def _host_slot(url: str) -> dict:
+    host = urlsplit(url).netloc.lower()
+    with _hosts_lock:
+        if host not in _hosts:
+            _hosts[host] = {"semaphore": threading.BoundedSemaphore(PER_HOST_CONCURRENCY),
+                            "lock": threading.Lock(), "last": 0.0}
+        return _hosts[host]
+
+def _polite_scrape(url: str) -> dict:
+    slot = _host_slot(url)
+    with slot["semaphore"]:
+        with slot["lock"]:
+            wait = slot["last"] + PER_HOST_DELAY - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            slot["last"] = time.monotonic()
+        return scrape_website(url)
+
+def scrape_websites(urls, max_workers: int = 8) -> dict:
+    """
+    Scrape many URLs concurrently. Each host gets at most PER_HOST_CONCURRENCY requests in
+    flight, started at least PER_HOST_DELAY seconds apart. Returns {url: result} in input order.
+    """
+    unique = list(dict.fromkeys(url.strip() for url in urls if url and url.strip()))
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return dict(zip(unique, pool.map(_polite_scrape, unique)))
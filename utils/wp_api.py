@@ -1,42 +1,137 @@
 # utils/wp_api.py
-import requests
-import streamlit as st
-from utils.auth import get_basic_auth_headers
+from concurrent.futures import ThreadPoolExecutor
+from utils.http_session import get_session
+from utils import journal
+from utils.diff import changed_fields
 
-# In-memory backup for rollback (for demonstration; production should use persistent storage)
-if "backup_log" not in st.session_state:
-    st.session_state["backup_log"] = []
+def _fetch_page(api_base: str, headers: dict, endpoint: str, params: dict, page: int):
+    """Fetch a single collection page; returns the response object."""
+    page_params = dict(params, page=page)
+    return get_session(api_base).get(f"{api_base}/{endpoint}", headers=headers, params=page_params)
 
-def fetch_items(api_base: str, headers: dict, endpoint: str) -> list:
-    """Fetch up to 100 items from the given endpoint."""
+def iter_items(api_base: str, headers: dict, endpoint: str, fields: list = None,
+               per_page: int = 100, max_workers: int = 4, params: dict = None):
+    """
+    Yield every item of the given endpoint, page by page.
+    The first page is fetched alone to read X-WP-TotalPages; the remaining pages are
+    fetched in parallel by a bounded worker pool and yielded in page order as they arrive.
+    Pass `fields` to request a `_fields=` projection (e.g. ["id", "title"]).
+    Raises RuntimeError on a non-200 response.
+    """
+    query = dict(params or {}, per_page=per_page)
+    if fields:
+        query["_fields"] = ",".join(fields)
+    resp = _fetch_page(api_base, headers, endpoint, query, 1)
+    if resp.status_code != 200:
+        raise RuntimeError(f"HTTP {resp.status_code}: {resp.text}")
+    total_pages = int(resp.headers.get("X-WP-TotalPages", 1) or 1)
+    for item in resp.json():
+        yield item
+    if total_pages <= 1:
+        return
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(_fetch_page, api_base, headers, endpoint, query, page)
+                   for page in range(2, total_pages + 1)]
+        try:
+            for future in futures:
+                page_resp = future.result()
+                if page_resp.status_code != 200:
+                    raise RuntimeError(f"HTTP {page_resp.status_code}: {page_resp.text}")
+                for item in page_resp.json():
+                    yield item
+        finally:
+            for future in futures:
+                future.cancel()
+
+def count_items(api_base: str, headers: dict, endpoint: str, params: dict = None) -> int:
+    """Return the collection size reported in X-WP-Total, fetching a single id."""
+    query = dict(params or {}, per_page=1, _fields="id")
+    resp = _fetch_page(api_base, headers, endpoint, query, 1)
+    if resp.status_code != 200:
+        raise RuntimeError(f"HTTP {resp.status_code}: {resp.text}")
+    return int(resp.headers.get("X-WP-Total", 0) or 0)
+
+def fetch_items(api_base: str, headers: dict, endpoint: str, fields: list = None) -> list:
+    """Fetch all items from the given endpoint (every page)."""
     try:
-        resp = requests.get(f"{api_base}/{endpoint}?per_page=100", headers=headers)
-        if resp.status_code == 200:
-            return resp.json()
-        else:
-            return None
+        return list(iter_items(api_base, headers, endpoint, fields=fields))
     except Exception as e:
         return None
 
-def backup_item(api_base: str, headers: dict, endpoint: str, item_id: str) -> dict:
-    """Fetch and return the current state of an item for rollback."""
+SNAPSHOT_PAGE_SIZE = 100
+
+def _fetch_included(api_base: str, headers: dict, endpoint: str, ids: list) -> list:
+    params = {"include": ",".join(ids), "per_page": SNAPSHOT_PAGE_SIZE, "context": "edit"}
     try:
-        resp = requests.get(f"{api_base}/{endpoint}/{item_id}", headers=headers)
-        if resp.status_code == 200:
-            backup = resp.json()
-            st.session_state["backup_log"].append({"endpoint": endpoint, "id": item_id, "data": backup})
-            return backup
-        else:
-            return {}
+        resp = _fetch_page(api_base, headers, endpoint, params, 1)
+        return resp.json() if resp.status_code == 200 else []
     except Exception as e:
+        return []
+
+def _fetch_one(api_base: str, headers: dict, endpoint: str, item_id: str) -> dict:
+    try:
+        resp = get_session(api_base).get(f"{api_base}/{endpoint}/{item_id}", headers=headers,
+                                         params={"context": "edit"})
+        return resp.json() if resp.status_code == 200 else None
+    except Exception as e:
+        return None
+
+def backup_item(api_base: str, headers: dict, endpoint: str, item_id: str, op_id: str = None) -> dict:
+    """
+    Fetch and return the current state of an item, journaling it under `op_id` for rollback
+    (a new single-item operation when no id is given).
+    """
+    backup = _fetch_one(api_base, headers, endpoint, item_id)
+    if backup is None:
         return {}
+    op_id = op_id or journal.begin_operation(api_base, endpoint)
+    journal.record_snapshots(op_id, api_base, endpoint, {item_id: backup})
+    return backup
+
+def snapshot_items(api_base: str, headers: dict, endpoint: str, item_ids: list,
+                   known_items: list = None, op_id: str = None, max_workers: int = 4) -> dict:
+    """
+    Capture the current state of many items for rollback before a batch runs.
+    Items already present in `known_items` (e.g. the output of fetch_items for this run) are
+    reused; the rest are fetched with `?include=...&per_page=100` in parallel. Ids the collection
+    does not return (drafts, private items) fall back to a single GET each.
+    All snapshots are written to the rollback journal under `op_id` in one pass.
+    Returns {item_id: data}.
+    """
+    ids = list(dict.fromkeys(str(item_id) for item_id in item_ids))
+    known = {str(item["id"]): item for item in known_items or [] if "id" in item}
+    snapshots = {item_id: known[item_id] for item_id in ids if item_id in known}
+    missing = [item_id for item_id in ids if item_id not in snapshots]
+    chunks = [missing[i:i + SNAPSHOT_PAGE_SIZE] for i in range(0, len(missing), SNAPSHOT_PAGE_SIZE)]
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for page in pool.map(lambda chunk: _fetch_included(api_base, headers, endpoint, chunk), chunks):
+            for item in page:
+                snapshots[str(item["id"])] = item
+        leftovers = [item_id for item_id in missing if item_id not in snapshots]
+        for item_id, item in zip(leftovers, pool.map(lambda i: _fetch_one(api_base, headers, endpoint, i), leftovers)):
+            if item is not None:
+                snapshots[item_id] = item
+    op_id = op_id or journal.begin_operation(api_base, endpoint)
+    journal.record_snapshots(op_id, api_base, endpoint, {item_id: snapshots[item_id] for item_id in ids
+                                                         if item_id in snapshots})
+    return snapshots
 
-def update_item(api_base: str, headers: dict, endpoint: str, action: dict) -> (bool, str):
-    """Update an existing item. Backs up the original content first."""
+def update_item(api_base: str, headers: dict, endpoint: str, action: dict, op_id: str = None,
+                backup: bool = True) -> (bool, str):
+    """
+    Update an existing item. Backs up the original content first and then only sends the
+    fields that differ from it; an update that changes nothing is skipped.
+    """
     try:
-        backup_item(api_base, headers, endpoint, action["id"])
+        changes = action["changes"]
+        if backup:
+            current = backup_item(api_base, headers, endpoint, action["id"], op_id)
+            if current:
+                changes = changed_fields(current, changes)
+                if not changes:
+                    return True, f"ID {action.get('id')} unchanged; skipped."
         url = f"{api_base}/{endpoint}/{action['id']}"
-        resp = requests.post(url, headers=headers, json=action["changes"])
+        resp = get_session(api_base).post(url, headers=headers, json=changes)
         if resp.status_code in (200, 201):
             return True, f"ID {action.get('id')} updated."
         else:
@@ -44,24 +139,29 @@ def update_item(api_base: str, headers: dict, endpoint: str, action: dict) -> (b
     except Exception as e:
         return False, str(e)
 
-def create_item(api_base: str, headers: dict, endpoint: str, action: dict) -> (bool, str):
-    """Create a new item."""
+def create_item(api_base: str, headers: dict, endpoint: str, action: dict, op_id: str = None) -> (bool, str):
+    """Create a new item, journaling its id under `op_id` so rollback can remove it."""
     try:
         url = f"{api_base}/{endpoint}"
-        resp = requests.post(url, headers=headers, json=action["changes"])
+        resp = get_session(api_base).post(url, headers=headers, json=action["changes"])
         if resp.status_code in (200, 201):
-            return True, f"New item created with ID {resp.json().get('id')}"
+            new_id = resp.json().get("id")
+            if op_id:
+                journal.record_created(op_id, api_base, endpoint, new_id)
+            return True, f"New item created with ID {new_id}"
         else:
             return False, f"HTTP {resp.status_code}: {resp.text}"
     except Exception as e:
         return False, str(e)
 
-def delete_item(api_base: str, headers: dict, endpoint: str, action: dict) -> (bool, str):
+def delete_item(api_base: str, headers: dict, endpoint: str, action: dict, op_id: str = None,
+                backup: bool = True) -> (bool, str):
     """Delete an item (backing it up first)."""
     try:
-        backup_item(api_base, headers, endpoint, action["id"])
+        if backup:
+            backup_item(api_base, headers, endpoint, action["id"], op_id)
         url = f"{api_base}/{endpoint}/{action['id']}"
-        resp = requests.delete(url, headers=headers)
+        resp = get_session(api_base).delete(url, headers=headers)
         if resp.status_code in (200, 201):
             return True, f"ID {action.get('id')} deleted."
         else:
@@ -69,28 +169,110 @@ def delete_item(api_base: str, headers: dict, endpoint: str, action: dict) -> (b
     except Exception as e:
         return False, str(e)
 
-def rollback_last_operation() -> (bool, str):
+BATCH_LIMIT = 25  # WordPress accepts at most 25 sub-requests per batch call
+BATCH_UNAVAILABLE = (403, 404, 405, 501)  # /batch/v1 blocked (e.g. by a security plugin) or missing
+_batch_support = {}
+
+def supports_batch(api_base: str, headers: dict, endpoint: str) -> bool:
     """
-    Roll back the last operation using the backup log.
-    For each item in the last backup, re-update the item with its original data.
+    Check (once per site and endpoint) whether the route can be used with /batch/v1.
+    WordPress 5.6+ advertises this as `allow_batch` in the route's OPTIONS response.
     """
-    if not st.session_state["backup_log"]:
-        return False, "No backup available."
-    last_backup = st.session_state["backup_log"].pop()
-    endpoint = last_backup["endpoint"]
-    item_id = last_backup["id"]
-    original_data = last_backup["data"]
-    wp_site = st.session_state["active_site"]
-    api_base = wp_site["site_url"] + "/wp-json/wp/v2"
-    headers = get_basic_auth_headers(wp_site["username"], wp_site["app_password"])
+    key = (api_base, endpoint)
+    if key not in _batch_support:
+        try:
+            resp = get_session(api_base).options(f"{api_base}/{endpoint}", headers=headers)
+            allow = resp.json().get("allow_batch") if resp.status_code == 200 else None
+            _batch_support[key] = bool(allow and allow.get("v1"))
+        except Exception as e:
+            _batch_support[key] = False
+    return _batch_support[key]
+
+def _batch_subrequest(api_base: str, endpoint: str, action: dict) -> dict:
+    route = "/" + api_base.split("/wp-json/", 1)[1].strip("/") + f"/{endpoint}"
+    if action["action"] == "create":
+        return {"method": "POST", "path": route, "body": action["changes"]}
+    elif action["action"] == "update":
+        return {"method": "POST", "path": f"{route}/{action['id']}", "body": action["changes"]}
+    return {"method": "DELETE", "path": f"{route}/{action['id']}"}
+
+def _batch_result(action: dict, sub: dict) -> (bool, str):
+    status = sub.get("status", 0)
+    body = sub.get("body") or {}
+    if status not in (200, 201):
+        return False, f"HTTP {status}: {body.get('message', body) if isinstance(body, dict) else body}"
+    if action["action"] == "create":
+        return True, f"New item created with ID {body.get('id')}"
+    elif action["action"] == "update":
+        return True, f"ID {action.get('id')} updated."
+    return True, f"ID {action.get('id')} deleted."
+
+def _apply_one(api_base: str, headers: dict, endpoint: str, action: dict, op_id: str = None) -> (bool, str):
+    """Per-item fallback for a batch whose items were already backed up."""
+    if action["action"] == "create":
+        return create_item(api_base, headers, endpoint, action, op_id)
+    elif action["action"] == "update":
+        return update_item(api_base, headers, endpoint, action, op_id, backup=False)
+    return delete_item(api_base, headers, endpoint, action, op_id, backup=False)
+
+def batch_items(api_base: str, headers: dict, endpoint: str, actions: list, op_id: str = None,
+                backup: bool = True) -> list:
+    """
+    Apply up to BATCH_LIMIT create/update/delete actions in one /wp-json/batch/v1 call.
+    Items are backed up first unless `backup` is False, as with update_item/delete_item.
+    If the batch route turns out to be unavailable (403/404/405/501), batching is switched off
+    for the site and endpoint and the actions are sent one by one instead.
+    Returns one (success, message) tuple per action, in the same order as `actions`.
+    """
+    if len(actions) > BATCH_LIMIT:
+        raise ValueError(f"At most {BATCH_LIMIT} actions per batch.")
+    for action in actions:
+        if backup and action["action"] in ("update", "delete"):
+            backup_item(api_base, headers, endpoint, action["id"], op_id)
+    if _batch_support.get((api_base, endpoint)) is False:
+        return [_apply_one(api_base, headers, endpoint, action, op_id) for action in actions]
+    batch_url = api_base.split("/wp-json/", 1)[0] + "/wp-json/batch/v1"
+    payload = {"validation": "normal",
+               "requests": [_batch_subrequest(api_base, endpoint, action) for action in actions]}
     try:
-        # Rollback using original title and content.
-        changes = {"title": original_data.get("title"), "content": original_data.get("content")}
-        url = f"{api_base}/{endpoint}/{item_id}"
-        resp = requests.post(url, headers=headers, json=changes)
-        if resp.status_code in (200, 201):
-            return True, f"ID {item_id} rolled back."
-        else:
-            return False, f"HTTP {resp.status_code}: {resp.text}"
+        resp = get_session(api_base).post(batch_url, headers=headers, json=payload)
+        if resp.status_code in BATCH_UNAVAILABLE:
+            _batch_support[(api_base, endpoint)] = False
+            return [_apply_one(api_base, headers, endpoint, action, op_id) for action in actions]
+        if resp.status_code not in (200, 207):
+            return [(False, f"HTTP {resp.status_code}: {resp.text}")] * len(actions)
+        responses = resp.json().get("responses", [])
+        outcomes = []
+        for i, action in enumerate(actions):
+            sub = responses[i] if i < len(responses) else {}
+            outcome = _batch_result(action, sub)
+            if op_id and outcome[0] and action["action"] == "create":
+                journal.record_created(op_id, api_base, endpoint, sub["body"].get("id"))
+            outcomes.append(outcome)
+        return outcomes
     except Exception as e:
-        return False, str(e)
+        return [(False, str(e))] * len(actions)
+
+def _active_site() -> dict:
+    """The site selected in the UI; Streamlit is only needed once a rollback is requested."""
+    import streamlit as st
+    return st.session_state["active_site"]
+
+def rollback_operation(op_id: str, max_workers: int = 4) -> (bool, str):
+    """Roll back one journaled operation on the active site, restoring its items in parallel."""
+    from utils.auth import get_basic_auth_headers
+    wp_site = _active_site()
+    api_base = wp_site["site_url"] + "/wp-json/wp/v2"
+    headers = get_basic_auth_headers(wp_site["username"], wp_site["app_password"])
+    return journal.rollback_operation(op_id, api_base, headers, max_workers=max_workers)
+
+def rollback_last_operation() -> (bool, str):
+    """
+    Roll back the most recent operation on the active site using the rollback journal.
+    Every snapshotted item is restored with all of its fields and meta; created items are deleted.
+    """
+    wp_site = _active_site()
+    last = journal.last_operation(journal.site_of(wp_site["site_url"]))
+    if not last:
+        return False, "No backup available."
+    return rollback_operation(last["op_id"])